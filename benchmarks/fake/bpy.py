@@ -0,0 +1,202 @@
+# A stand-in for the slice of the bpy data model the exporter reads, good
+# enough to run collada_exporter outside Blender. Collections keep their
+# per element properties as NumPy arrays so foreach_get costs about what it
+# costs in Blender; items are only materialized for the properties the
+# exporter reads one element at a time (vertex groups, bones, keyframes).
+import types as pytypes
+import numpy
+
+class PropCollection:
+    def __init__(self, items=(), arrays=None):
+        self.items = list(items)
+        self.arrays = arrays if arrays != None else {}
+        self.count = len(self.items)
+        for a in self.arrays.values():
+            self.count = max(self.count, len(a))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, key):
+        if(isinstance(key, str)):
+            for item in self.items:
+                if(item.name == key):
+                    return item
+            raise KeyError(key)
+        return self.items[key]
+
+    def foreach_get(self, name, buffer):
+        values = self.arrays.get(name)
+        if(values is None):
+            values = numpy.array([ getattr(i, name) for i in self.items ])
+        buffer[:] = numpy.asarray(values).ravel()
+
+class VertexGroupElement:
+    __slots__ = ('group', 'weight')
+    def __init__(self, group, weight):
+        self.group = group
+        self.weight = weight
+
+class MeshVertex:
+    __slots__ = ('index', 'groups')
+    def __init__(self, index, groups):
+        self.index = index
+        self.groups = groups
+
+class MeshUVLoopLayer:
+    def __init__(self, name, uvs):
+        self.name = name
+        self.data = PropCollection(arrays={'uv': uvs})
+
+class Mesh:
+    def __init__(self, name, positions, loopVertices, loopStart, loopTotal, polygonNormals, uvLayers, vertexGroups=None):
+        self.name = name
+        if(vertexGroups == None):
+            vertexGroups = [ [] for i in range(len(positions)) ]
+        self.vertices = PropCollection([ MeshVertex(i, g) for i, g in enumerate(vertexGroups) ], {'co': positions})
+        self.loops = PropCollection(arrays={'vertex_index': loopVertices})
+        self.polygons = PropCollection(arrays={'loop_start': loopStart, 'loop_total': loopTotal, 'normal': polygonNormals})
+        self.uv_layers = PropCollection([ MeshUVLoopLayer('UVMap' + str(i), uvs) for i, uvs in enumerate(uvLayers) ])
+        self.animation_data = None
+        self.shape_keys = None
+
+    # Smooth shading everywhere: the split normal of a loop is the average
+    # of the face normals around its vertex.
+    def calc_normals_split(self):
+        loopVertices = self.loops.arrays['vertex_index']
+        loopTotal = self.polygons.arrays['loop_total']
+        faceNormals = numpy.repeat(self.polygons.arrays['normal'], loopTotal, axis=0)
+        vertexNormals = numpy.zeros((len(self.vertices), 3))
+        numpy.add.at(vertexNormals, loopVertices, faceNormals)
+        lengths = numpy.linalg.norm(vertexNormals, axis=1)
+        lengths[lengths == 0.0] = 1.0
+        self.loops.arrays['normal'] = (vertexNormals / lengths[:, None]).astype(numpy.float32)[loopVertices]
+
+    def free_normals_split(self):
+        self.loops.arrays.pop('normal', None)
+
+class ShapeKey:
+    def __init__(self, name, positions, relative_key=None, value=0.0):
+        self.name = name
+        self.data = PropCollection(arrays={'co': positions})
+        self.relative_key = relative_key if relative_key != None else self
+        self.value = value
+        self.mute = False
+
+class Key:
+    def __init__(self, name, key_blocks):
+        self.name = name
+        self.key_blocks = PropCollection(key_blocks)
+        self.reference_key = key_blocks[0]
+        self.use_relative = True
+        self.animation_data = None
+
+class Bone:
+    def __init__(self, name, parent, matrix_local, use_connect=False):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.matrix_local = matrix_local
+        self.use_connect = use_connect
+        if(parent != None):
+            parent.children.append(self)
+
+class Armature:
+    def __init__(self, name, bones):
+        self.name = name
+        self.bones = PropCollection(bones)
+        self.animation_data = None
+
+class Keyframe:
+    __slots__ = ('co', 'interpolation')
+    def __init__(self, co, interpolation):
+        self.co = co
+        self.interpolation = interpolation
+
+# Every interpolation mode is evaluated linearly; the point is to exercise
+# the exporter's evaluate() path, not to reproduce Blender's curves.
+class FCurve:
+    def __init__(self, data_path, array_index, times, values, interpolation='LINEAR'):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.times = numpy.asarray(times, dtype=numpy.float64)
+        self.values = numpy.asarray(values, dtype=numpy.float64)
+        coords = numpy.stack((self.times, self.values), axis=1).astype(numpy.float32)
+        self.keyframe_points = PropCollection([ Keyframe((float(t), float(v)), interpolation) for t, v in coords ], {'co': coords})
+        self.modifiers = []
+        self.extrapolation = 'CONSTANT'
+
+    def evaluate(self, frame):
+        return float(numpy.interp(frame, self.times, self.values))
+
+class Action:
+    def __init__(self, name, fcurves, id_root='OBJECT'):
+        self.name = name
+        self.fcurves = PropCollection(fcurves)
+        self.id_root = id_root
+
+class NlaStrip:
+    def __init__(self, name, action):
+        self.name = name
+        self.action = action
+
+class NlaTrack:
+    def __init__(self, name, strips):
+        self.name = name
+        self.strips = PropCollection(strips)
+
+class AnimData:
+    def __init__(self, tracks, action=None):
+        self.nla_tracks = PropCollection(tracks)
+        self.action = action
+
+class Modifier:
+    def __init__(self, name, type, object=None):
+        self.name = name
+        self.type = type
+        self.object = object
+
+class VertexGroup:
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+class Object:
+    def __init__(self, name, type, data, matrix_world, matrix_local=None, modifiers=(), vertex_groups=(), animation_data=None):
+        self.name = name
+        self.type = type
+        self.data = data
+        self.matrix_world = matrix_world
+        self.matrix_local = matrix_local if matrix_local != None else matrix_world.copy()
+        self.modifiers = PropCollection(modifiers)
+        self.vertex_groups = PropCollection(vertex_groups)
+        self.animation_data = animation_data
+
+    def update_from_editmode(self):
+        return False
+
+class Scene:
+    def __init__(self, name, objects):
+        self.name = name
+        self.objects = PropCollection(objects)
+
+data = pytypes.SimpleNamespace(scenes=[])
+context = pytypes.SimpleNamespace(scene=None)
+
+# Registration surface used by the add-on's __init__ and operator module.
+def property(**kwargs):
+    return None
+
+types = pytypes.SimpleNamespace(Operator=object,
+    INFO_MT_file_export=pytypes.SimpleNamespace(append=lambda f: None, remove=lambda f: None))
+props = pytypes.SimpleNamespace(StringProperty=property, IntProperty=property, BoolProperty=property,
+    FloatProperty=property, EnumProperty=property)
+utils = pytypes.SimpleNamespace(register_module=lambda name: None, unregister_module=lambda name: None)
+app = pytypes.SimpleNamespace(binary_path_python=None, version=(2, 79, 0))
+
+def setScene(scene):
+    data.scenes[:] = [scene]
+    context.scene = scene
@@ -0,0 +1,54 @@
+# The parts of mathutils the exporter uses, on top of NumPy. Like the real
+# module, matrices hold float32 values and multiply with '*'.
+import numpy
+
+class Matrix:
+    def __init__(self, rows=None):
+        if(rows is None):
+            rows = numpy.identity(4)
+        self.values = numpy.array(rows, dtype=numpy.float64)
+
+    @classmethod
+    def Identity(cls, size):
+        return cls(numpy.identity(size))
+
+    @classmethod
+    def Translation(cls, vector):
+        m = numpy.identity(4)
+        m[:3, 3] = vector[:3]
+        return cls(m)
+
+    def copy(self):
+        return Matrix(self.values.copy())
+
+    def invert(self):
+        self.values = numpy.linalg.inv(self.values)
+
+    def inverted(self):
+        return Matrix(numpy.linalg.inv(self.values))
+
+    def transpose(self):
+        self.values = self.values.T.copy()
+
+    def transposed(self):
+        return Matrix(self.values.T.copy())
+
+    def to_4x4(self):
+        m = numpy.identity(4)
+        m[:3, :3] = self.values[:3, :3]
+        return Matrix(m)
+
+    def __mul__(self, other):
+        return Matrix(numpy.dot(self.values, other.values))
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values.astype(numpy.float32 if dtype is None else dtype)
+
+class Vector(tuple):
+    pass
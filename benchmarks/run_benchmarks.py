@@ -0,0 +1,175 @@
+# Times the exporter stages on synthetic scenes, outside Blender:
+#
+#   python benchmarks/run_benchmarks.py [--preset small|medium|large ...]
+#       [--case name:vertices=..,bones=..,frames=..,meshes=..,clips=..,shapeKeys=..] [--repeat N]
+#       [--set setting=value ...] [--output results.json] [--compare old.json]
+#
+# bpy and mathutils come from benchmarks/fake. Every stage runs on its own
+# against a fresh in-memory writer:
+#
+#   visual_scene   loadLibVisualScene (also collects the meshes and skins)
+#   geometries     loadLibGeometries
+#   controllers    loadLibControllers
+#   animations     loadLibAnimations
+#   write          writeDocument, the whole document streamed to a file
+#
+# There is no separate formatting pass to time any more: the streaming
+# writer formats while each stage runs. Results are saved as JSON; with
+# --compare the best time of every stage is printed next to the one in an
+# earlier results file.
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, 'fake'))
+sys.path.insert(0, os.path.dirname(here))
+
+import numpy
+import scenes
+from io_scene_dae import collada_exporter
+from io_scene_dae.dae_writer import DAEWriter
+from io_scene_dae.settings import ExportSettings
+
+presets = {
+    'small': {'vertices': 2000, 'bones': 8, 'frames': 30},
+    'medium': {'vertices': 50000, 'bones': 32, 'frames': 120},
+    'large': {'vertices': 250000, 'bones': 64, 'frames': 240},
+}
+
+stages = ['visual_scene', 'geometries', 'controllers', 'animations', 'write']
+
+def parseValue(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parseCase(text):
+    name, _, params = text.partition(':')
+    case = {}
+    for item in params.split(','):
+        if(item != ''):
+            k, _, v = item.partition('=')
+            case[k] = parseValue(v)
+    return name, case
+
+def buildSettings(overrides):
+    settings = ExportSettings()
+    for k, v in overrides.items():
+        if(not hasattr(settings, k)):
+            raise ValueError('Unknown export setting: ' + k)
+        setattr(settings, k, v)
+    return settings
+
+def timeStage(settings, run):
+    stream = io.StringIO()
+    writer = DAEWriter(stream, settings.indent, 2)
+    start = time.perf_counter()
+    run(writer)
+    return time.perf_counter() - start, len(stream.getvalue())
+
+# One pass over all stages. The visual scene has to be walked before the
+# libraries, since that is what fills the mesh and controller tables.
+def runOnce(settings, directory):
+    session = collada_exporter.ExportSession(settings)
+    times = {}
+    sizes = {}
+    visualScene = io.StringIO()
+    start = time.perf_counter()
+    session.loadLibVisualScene(DAEWriter(visualScene, settings.indent, 2))
+    times['visual_scene'] = time.perf_counter() - start
+    sizes['visual_scene'] = len(visualScene.getvalue())
+    times['geometries'], sizes['geometries'] = timeStage(settings, session.loadLibGeometries)
+    times['controllers'], sizes['controllers'] = timeStage(settings, session.loadLibControllers)
+    times['animations'], sizes['animations'] = timeStage(settings, session.loadLibAnimations)
+
+    path = os.path.join(directory, 'benchmark.dae')
+    start = time.perf_counter()
+    session.writeDocument(path, visualScene.getvalue())
+    times['write'] = time.perf_counter() - start
+    sizes['write'] = os.path.getsize(path)
+    session.release()
+    return times, sizes
+
+def runCase(name, params, settings, repeat, directory):
+    start = time.perf_counter()
+    scenes.generateScene(**params)
+    setup = time.perf_counter() - start
+    runs = []
+    sizes = None
+    for i in range(repeat):
+        times, sizes = runOnce(settings, directory)
+        runs.append(times)
+    result = {'name': name, 'params': params, 'setup': setup, 'bytes': sizes, 'stages': {}}
+    for stage in stages:
+        values = [ r[stage] for r in runs ]
+        result['stages'][stage] = {'best': min(values), 'median': float(numpy.median(values)), 'runs': values}
+    return result
+
+def printResult(result, baseline):
+    print('{} {}'.format(result['name'], json.dumps(result['params'], sort_keys=True)))
+    for stage in stages:
+        best = result['stages'][stage]['best']
+        line = '  {:<14}{:>10.4f}s'.format(stage, best)
+        if(baseline != None and stage in baseline['stages']):
+            old = baseline['stages'][stage]['best']
+            line += '  was {:.4f}s  x{:.2f}'.format(old, old / best if best > 0.0 else float('inf'))
+        print(line)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the Collada exporter on synthetic scenes.')
+    parser.add_argument('--preset', action='append', choices=sorted(presets), help='named scene size, may repeat')
+    parser.add_argument('--case', action='append', default=[], help='name:key=value,... scene parameters, may repeat')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--set', action='append', default=[], help='setting=value export setting override, may repeat')
+    parser.add_argument('--output', default=None, help='results file, default benchmark-<time>.json')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    cases = [ (p, dict(presets[p])) for p in (args.preset or []) ]
+    cases += [ parseCase(c) for c in args.case ]
+    if(len(cases) == 0):
+        cases = [ ('small', dict(presets['small'])), ('medium', dict(presets['medium'])) ]
+    overrides = dict( (k, parseValue(v)) for k, _, v in (s.partition('=') for s in args.set) )
+
+    baselines = {}
+    if(args.compare != None):
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baselines = dict( (r['name'], r) for r in json.load(f)['cases'] )
+
+    directory = tempfile.mkdtemp(prefix='dae_benchmark')
+    results = []
+    try:
+        for name, params in cases:
+            result = runCase(name, params, buildSettings(overrides), args.repeat, directory)
+            printResult(result, baselines.get(name))
+            results.append(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = args.output
+    if(output == None):
+        output = 'benchmark-{}.json'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+    report = {
+        'created': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'settings': overrides,
+        'repeat': args.repeat,
+        'cases': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print('results written to ' + output)
+
+if(__name__ == '__main__'):
+    main(sys.argv[1:])
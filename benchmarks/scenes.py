@@ -0,0 +1,147 @@
+# Parameterized synthetic scenes for the benchmarks: a rigged, animated
+# grid mesh. Everything is seeded, so a given set of parameters always
+# builds the same scene.
+import math
+import numpy
+
+import bpy
+from mathutils import Matrix
+
+def translation(x, y, z):
+    return Matrix.Translation((x, y, z))
+
+# A (rows + 1) x (cols + 1) vertex grid of quads with some height noise and
+# slightly perturbed face normals, closest to the requested vertex count.
+def gridMesh(name, vertexCount, uvLayers, rng):
+    cols = max(1, int(math.sqrt(vertexCount)) - 1)
+    rows = max(1, int(math.ceil(vertexCount / float(cols + 1))) - 1)
+    xs, ys = numpy.meshgrid(numpy.arange(cols + 1, dtype=numpy.float64), numpy.arange(rows + 1, dtype=numpy.float64))
+    positions = numpy.empty((xs.size, 3), dtype=numpy.float32)
+    positions[:, 0] = xs.ravel()
+    positions[:, 1] = ys.ravel()
+    positions[:, 2] = rng.uniform(-0.1, 0.1, xs.size)
+
+    r, c = numpy.meshgrid(numpy.arange(rows), numpy.arange(cols), indexing='ij')
+    corner = (r * (cols + 1) + c).ravel()
+    quads = numpy.stack((corner, corner + 1, corner + cols + 2, corner + cols + 1), axis=1)
+    polygonCount = len(quads)
+    loopVertices = quads.ravel().astype(numpy.int32)
+    loopStart = (numpy.arange(polygonCount) * 4).astype(numpy.int32)
+    loopTotal = numpy.full(polygonCount, 4, dtype=numpy.int32)
+    normals = rng.normal(0.0, 0.05, (polygonCount, 3))
+    normals[:, 2] += 1.0
+    normals /= numpy.linalg.norm(normals, axis=1)[:, None]
+
+    uvs = []
+    for i in range(uvLayers):
+        layer = positions[loopVertices, :2] / numpy.array([cols, rows], dtype=numpy.float32)
+        uvs.append((layer + i * 0.01).astype(numpy.float32))
+    return bpy.Mesh(name, positions, loopVertices, loopStart, loopTotal, normals.astype(numpy.float32), uvs), positions
+
+# A chain of bones along the grid's y axis.
+def chainArmature(name, boneCount, length):
+    bones = []
+    parent = None
+    step = length / float(boneCount)
+    for i in range(boneCount):
+        bone = bpy.Bone('Bone{:03d}'.format(i), parent, translation(0.0, step * i, 0.0), i != 0)
+        bones.append(bone)
+        parent = bone
+    return bpy.Armature(name, bones)
+
+# Up to `influences` bones per vertex, weighted by distance along the chain
+# and rounded to two decimals the way painted weights tend to repeat.
+def vertexGroups(positions, boneCount, length, influences):
+    bonePositions = (numpy.arange(boneCount) + 0.5) * (length / float(boneCount))
+    distance = numpy.abs(positions[:, 1:2] - bonePositions[None, :])
+    nearest = numpy.argsort(distance, axis=1)[:, :influences]
+    weights = 1.0 / (1.0 + numpy.take_along_axis(distance, nearest, axis=1))
+    weights = numpy.round(weights / weights.sum(axis=1)[:, None], 2).astype(numpy.float32)
+    groups = []
+    for bonesOfVertex, weightsOfVertex in zip(nearest.tolist(), weights.tolist()):
+        groups.append([ bpy.VertexGroupElement(b, w) for b, w in zip(bonesOfVertex, weightsOfVertex) ])
+    return groups
+
+# One key per frame on every location, rotation and scale channel of every
+# bone, like a baked motion capture clip.
+def boneAction(name, armature, frameCount, interpolation, rng):
+    times = numpy.arange(frameCount + 1, dtype=numpy.float64)
+    fcurves = []
+    for bone in armature.bones:
+        phase = rng.uniform(0.0, 2.0 * math.pi)
+        path = 'pose.bones["{}"].'.format(bone.name)
+        for i in range(3):
+            fcurves.append(bpy.FCurve(path + 'location', i, times, 0.05 * numpy.sin(times * 0.1 + phase + i), interpolation))
+        angle = 0.3 * numpy.sin(times * 0.07 + phase)
+        quaternion = (numpy.cos(angle * 0.5), numpy.sin(angle * 0.5), numpy.zeros(len(times)), numpy.zeros(len(times)))
+        for i in range(4):
+            fcurves.append(bpy.FCurve(path + 'rotation_quaternion', i, times, quaternion[i], interpolation))
+        for i in range(3):
+            fcurves.append(bpy.FCurve(path + 'scale', i, times, numpy.ones(len(times)), interpolation))
+    return bpy.Action(name, fcurves)
+
+# copies adds that many single user duplicates of every mesh, under other
+# names, as instancing candidates.
+def copyMesh(mesh, name):
+    copy = bpy.Mesh(name, mesh.vertices.arrays['co'], mesh.loops.arrays['vertex_index'], mesh.polygons.arrays['loop_start'],
+        mesh.polygons.arrays['loop_total'], mesh.polygons.arrays['normal'], [ layer.data.arrays['uv'] for layer in mesh.uv_layers ],
+        [ v.groups for v in mesh.vertices ])
+    return copy
+
+# shapeKeys gives every mesh that many shape keys, each lifting a patch of
+# the grid, and an action blending them in and out over the frames.
+def shapeKeyAction(mesh, positions, keyCount, frameCount, rng):
+    basis = bpy.ShapeKey('Basis', positions)
+    blocks = [basis]
+    times = numpy.arange(frameCount + 1, dtype=numpy.float64)
+    fcurves = []
+    for k in range(keyCount):
+        center = positions[rng.randint(len(positions))]
+        distance = numpy.linalg.norm(positions[:, :2] - center[:2], axis=1)
+        shifted = positions.copy()
+        shifted[:, 2] += numpy.maximum(0.0, 1.0 - distance / 3.0).astype(numpy.float32)
+        name = 'Key{:02d}'.format(k)
+        blocks.append(bpy.ShapeKey(name, shifted, basis))
+        fcurves.append(bpy.FCurve('key_blocks["{}"].value'.format(name), 0, times, 0.5 + 0.5 * numpy.sin(times * 0.1 + k)))
+    mesh.shape_keys = bpy.Key('Key.' + mesh.name, blocks)
+    action = bpy.Action('Shapes', fcurves, 'KEY')
+    mesh.shape_keys.animation_data = bpy.AnimData([ bpy.NlaTrack('Track', [ bpy.NlaStrip('Shapes', action) ]) ])
+
+# clips puts that many actions on the rig, one NLA strip each.
+def generateScene(vertices=10000, bones=16, frames=60, meshes=1, copies=0, uvLayers=1, influences=4, interpolation='LINEAR', seed=0, clips=1, shapeKeys=0):
+    rng = numpy.random.RandomState(seed)
+    objects = []
+    armature = chainArmature('Armature', bones, 1.0)
+    animation = None
+    if(frames > 0):
+        strips = []
+        for c in range(clips):
+            name = 'Clip{:02d}'.format(c) if c != 0 else 'Clip'
+            strips.append(bpy.NlaStrip(name, boneAction(name, armature, frames, interpolation, rng)))
+        animation = bpy.AnimData([ bpy.NlaTrack('Track', strips) ])
+    rig = bpy.Object('Rig', 'ARMATURE', armature, translation(0.0, 0.0, 0.0), animation_data=animation)
+    objects.append(rig)
+
+    groupNames = [ bpy.VertexGroup(b.name, i) for i, b in enumerate(armature.bones) ]
+    for m in range(meshes):
+        mesh, positions = gridMesh('Mesh{:03d}'.format(m), vertices, uvLayers, rng)
+        if(shapeKeys > 0 and frames > 0):
+            shapeKeyAction(mesh, positions, shapeKeys, frames, rng)
+        length = float(positions[:, 1].max()) + 1.0
+        if(bones > 0 and influences > 0):
+            groups = vertexGroups(positions, bones, length, influences)
+            for vertex, g in zip(mesh.vertices, groups):
+                vertex.groups = g
+            modifiers = [ bpy.Modifier('Armature', 'ARMATURE', rig) ]
+        else:
+            modifiers = []
+        objects.append(bpy.Object('Object{:03d}'.format(m), 'MESH', mesh, translation(m * 2.0, 0.0, 0.0),
+            modifiers=modifiers, vertex_groups=groupNames if len(modifiers) != 0 else []))
+        for c in range(copies):
+            copy = copyMesh(mesh, '{}.{:03d}'.format(mesh.name, c + 1))
+            objects.append(bpy.Object('Object{:03d}.{:03d}'.format(m, c + 1), 'MESH', copy, translation(m * 2.0, 0.0, 2.0 * (c + 1)),
+                modifiers=modifiers, vertex_groups=groupNames if len(modifiers) != 0 else []))
+
+    scene = bpy.Scene('Scene', objects)
+    bpy.setScene(scene)
+    return scene
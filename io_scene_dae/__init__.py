@@ -5,32 +5,51 @@ bl_info = {
     'category': 'Import-Export',
 }
 
-import bpy
-import imp
-if( "collada_exporter" in locals()):
-    imp.reload(collada_exporter)
+try:
+    import bpy
+except ImportError:
+    # Imported outside Blender, e.g. by the export worker processes, which
+    # only use the bpy-free modules of the package.
+    bpy = None
 
-from . import collada_exporter
+if(bpy != None):
+    import imp
+    # Reloaded in dependency order so every module picks up the fresh
+    # version of the ones it imports.
+    if( "collada_exporter" in locals()):
+        imp.reload(settings)
+        imp.reload(numeric_text)
+        imp.reload(quantize)
+        imp.reload(sidecar)
+        imp.reload(dae_writer)
+        imp.reload(dae_reader)
+        imp.reload(mesh_arrays)
+        imp.reload(vertex_cache)
+        imp.reload(simplify)
+        imp.reload(anim_arrays)
+        imp.reload(fragment_cache)
+        imp.reload(profiler)
+        imp.reload(fragments)
+        imp.reload(collada_exporter)
+        imp.reload(exporter_operator)
 
-class DAEExporter(bpy.types.Operator):
-    """My Object Moving Script"""      # blender will use this as a tooltip for menu items and buttons.
-    bl_idname = 'dae.exporter'        # unique identifier for buttons and menu items to reference.
-    bl_label = 'Collada Exporte'    # display name in the interface.
-    bl_options = {'PRESET'}  # enable undo for the operator.
-    
-    filepath = bpy.props.StringProperty(subtype="FILE_PATH")
-    
-    def invoke(self, context, event):
-        context.window_manager.fileselect_add(self)
-        return {'RUNNING_MODAL'}
-    
-    def execute(self, context):        # execute() is called by blender when running the operator.
-        collada_exporter.export(context, self.filepath)
-        return {'FINISHED'}            # this lets blender know the operator finished successfully.
+    from . import settings
+    from . import numeric_text
+    from . import quantize
+    from . import sidecar
+    from . import dae_writer
+    from . import dae_reader
+    from . import mesh_arrays
+    from . import vertex_cache
+    from . import simplify
+    from . import anim_arrays
+    from . import fragment_cache
+    from . import profiler
+    from . import fragments
+    from . import collada_exporter
+    from . import exporter_operator
+    from .exporter_operator import DAEExporter, menu_func
 
-def menu_func(self, context):
-    self.layout.operator(DAEExporter.bl_idname, text="Collada (.dae)")
-     
 def register():
     bpy.utils.register_module(__name__)
     bpy.types.INFO_MT_file_export.append(menu_func)
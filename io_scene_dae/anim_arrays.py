@@ -0,0 +1,138 @@
+import numpy
+
+# (time, value) of every keyframe of an fcurve, N x 2.
+def keyframeCoords(fcurve):
+    keys = fcurve.keyframe_points
+    coords = numpy.empty(len(keys) * 2, dtype=numpy.float32)
+    keys.foreach_get('co', coords)
+    return coords.reshape(-1, 2)
+
+# A curve made only of linear keys, without modifiers and with constant
+# extrapolation, is exactly what numpy.interp computes.
+def isPlainLinear(fcurve):
+    if(len(fcurve.modifiers) != 0 or fcurve.extrapolation != 'CONSTANT'):
+        return False
+    for kf in fcurve.keyframe_points:
+        if(kf.interpolation != 'LINEAR'):
+            return False
+    return True
+
+# Values of every channel at every time, len(timeline) x len(channels).
+# Plain linear curves are interpolated in one go, everything else still has
+# to go through fcurve.evaluate.
+def evaluateChannels(channels, timeline):
+    values = numpy.empty((len(timeline), len(channels)), dtype=numpy.float64)
+    for i, ch in enumerate(channels):
+        if(isPlainLinear(ch)):
+            coords = keyframeCoords(ch)
+            values[:, i] = numpy.interp(timeline, coords[:, 0], coords[:, 1])
+        else:
+            evaluate = ch.evaluate
+            values[:, i] = [ evaluate(t) for t in timeline.tolist() ]
+    return values
+
+# Rotation matrices of N quaternions (w, x, y, z), N x 3 x 3, with the same
+# formula mathutils uses, so unnormalized quaternions come out the same too.
+def quaternionsToMatrices(quats):
+    q = quats * numpy.sqrt(2.0)
+    qda = q[:, 0] * q[:, 1]
+    qdb = q[:, 0] * q[:, 2]
+    qdc = q[:, 0] * q[:, 3]
+    qaa = q[:, 1] * q[:, 1]
+    qab = q[:, 1] * q[:, 2]
+    qac = q[:, 1] * q[:, 3]
+    qbb = q[:, 2] * q[:, 2]
+    qbc = q[:, 2] * q[:, 3]
+    qcc = q[:, 3] * q[:, 3]
+    m = numpy.empty((len(quats), 3, 3), dtype=numpy.float64)
+    m[:, 0, 0] = 1.0 - qbb - qcc
+    m[:, 0, 1] = -qdc + qab
+    m[:, 0, 2] = qdb + qac
+    m[:, 1, 0] = qdc + qab
+    m[:, 1, 1] = 1.0 - qaa - qcc
+    m[:, 1, 2] = -qda + qbc
+    m[:, 2, 0] = -qdb + qac
+    m[:, 2, 1] = qda + qbc
+    m[:, 2, 2] = 1.0 - qaa - qbb
+    return m
+
+# Stacked rotation * scale * translation matrices, N x 4 x 4, the order the
+# exporter has always composed bone keys in. Missing parts are identity.
+# The result is float32, like the mathutils matrices it replaces, so the
+# written text rounds the same way.
+def composeMatrices(count, location=None, quaternion=None, scale=None):
+    mats = numpy.zeros((count, 4, 4), dtype=numpy.float64)
+    if(quaternion is not None):
+        mats[:, :3, :3] = quaternionsToMatrices(quaternion)
+    else:
+        mats[:, :3, :3] = numpy.identity(3)
+    if(scale is not None):
+        mats[:, :3, :3] *= scale[:, None, :]
+    if(location is not None):
+        mats[:, :3, 3] = numpy.einsum('nij,nj->ni', mats[:, :3, :3], location)
+    mats[:, 3, 3] = 1.0
+    return mats.astype(numpy.float32)
+
+# True when every key strictly between first and last is reproduced by
+# lerping the two matrices element by element, which is what LINEAR
+# interpolation of a float4x4 source means to readers. The translation
+# column of the lerped matrix must be within positionError; every basis
+# column within scaleError in length and rotationError in direction of the
+# key's, so a lerp across a turn that shrinks the basis is rejected too.
+def segmentFits(times, mats, first, last, positionError, rotationError, scaleError):
+    inner = numpy.arange(first + 1, last)
+    if(len(inner) == 0):
+        return True
+    alpha = ((times[inner] - times[first]) / (times[last] - times[first]))[:, None, None]
+    lerped = mats[first] + (mats[last] - mats[first]) * alpha
+    keys = mats[inner]
+    if(numpy.any(numpy.linalg.norm(lerped[:, :3, 3] - keys[:, :3, 3], axis=1) > positionError)):
+        return False
+    a = lerped[:, :3, :3]
+    b = keys[:, :3, :3]
+    lengthA = numpy.linalg.norm(a, axis=1)
+    lengthB = numpy.linalg.norm(b, axis=1)
+    if(numpy.any(numpy.abs(lengthA - lengthB) > scaleError)):
+        return False
+    cos = (a * b).sum(axis=1) / numpy.maximum(lengthA * lengthB, 1e-12)
+    return not numpy.any(numpy.arccos(numpy.clip(cos, -1.0, 1.0)) > rotationError)
+
+# Indices of the keys to keep. Starting from the first key, each segment is
+# stretched as far as linear interpolation between its ends stays within
+# the given errors of every key it skips. First and last keys always stay.
+def reduceKeys(times, mats, positionError, rotationError, scaleError):
+    count = len(times)
+    if(count <= 2):
+        return numpy.arange(count)
+    times = numpy.asarray(times, dtype=numpy.float64)
+    mats = numpy.asarray(mats, dtype=numpy.float64)
+    kept = [0]
+    first = 0
+    last = 2
+    while last < count:
+        if(not segmentFits(times, mats, first, last, positionError, rotationError, scaleError)):
+            first = last - 1
+            kept.append(first)
+        last += 1
+    kept.append(count - 1)
+    return numpy.array(kept, dtype=numpy.int64)
+
+# Vertex index of a 'vertices[12].co' fcurve path, None for any other path.
+def vertexPathIndex(dataPath):
+    if(not dataPath.startswith('vertices[') or not dataPath.endswith('].co')):
+        return None
+    return int(dataPath[len('vertices['):-len('].co')])
+
+# Vertex deltas of relative shape keys: weights is F x K, offsets K x V x 3
+# (every key's positions minus those of the key it is relative to).
+def shapeKeyDeltas(weights, offsets):
+    return numpy.tensordot(weights, offsets, axes=1)
+
+# Keeps the vertices some key moves further than threshold along any axis.
+# deltas is F x len(vertices) x 3; returns the kept vertices and their
+# deltas.
+def sparseDeltas(vertices, deltas, threshold):
+    if(deltas.size == 0):
+        return vertices[:0], deltas[:, :0]
+    moving = numpy.abs(deltas).max(axis=(0, 2)) > threshold
+    return vertices[moving], deltas[:, moving]
@@ -0,0 +1,121 @@
+# Exports many .blend files in one Blender process:
+#
+#   blender --background --python io_scene_dae/batch_export.py -- manifest.json [summary.json]
+#
+# The manifest is either a list of assets or an object with an "assets" list
+# and optional "settings" shared by all of them:
+#
+#   {
+#       "settings": { "precision": 5, "workers": 4 },
+#       "assets": [
+#           { "input": "hero.blend", "output": "out/hero.dae" },
+#           { "input": "prop.blend", "output": "out/prop.dae", "settings": { "indent": null } }
+#       ]
+#   }
+#
+# Settings are ExportSettings fields. Relative paths are taken from the
+# manifest's directory. A failed asset is recorded and the batch carries on;
+# the summary (default: manifest name + .summary.json) lists the wall time,
+# output size and error of every asset, and Blender exits with 1 if any
+# asset failed.
+import json
+import os
+import sys
+import time
+import traceback
+
+import bpy
+
+if(__package__ == None or __package__ == ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from io_scene_dae import collada_exporter
+    from io_scene_dae.settings import ExportSettings
+else:
+    from . import collada_exporter
+    from .settings import ExportSettings
+
+def scriptArgs(argv):
+    if('--' in argv):
+        return argv[argv.index('--') + 1:]
+    return []
+
+def loadManifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if(isinstance(manifest, list)):
+        manifest = {'assets': manifest}
+    return manifest
+
+def buildSettings(*overrides):
+    settings = ExportSettings()
+    for override in overrides:
+        if(override == None):
+            continue
+        for name, value in override.items():
+            if(not hasattr(settings, name)):
+                raise ValueError('Unknown export setting: ' + name)
+            setattr(settings, name, value)
+    return settings
+
+def outputSize(output, settings):
+    size = os.path.getsize(output)
+    if(settings.binarySidecar):
+        sidecar = os.path.splitext(output)[0] + '.bin'
+        if(os.path.exists(sidecar)):
+            size += os.path.getsize(sidecar)
+    return size
+
+def exportAsset(asset, baseDir, sharedSettings):
+    result = {'input': None, 'output': None, 'seconds': 0.0, 'bytes': 0, 'error': None}
+    start = time.perf_counter()
+    try:
+        # A malformed entry fails on its own instead of ending the batch.
+        input = result['input'] = os.path.join(baseDir, asset['input'])
+        output = result['output'] = os.path.join(baseDir, asset['output'])
+        settings = buildSettings(sharedSettings, asset.get('settings'))
+        outDir = os.path.dirname(output)
+        if(outDir != '' and not os.path.isdir(outDir)):
+            os.makedirs(outDir)
+        bpy.ops.wm.open_mainfile(filepath=input)
+        result['stats'] = collada_exporter.export(bpy.context, output, settings)
+        result['bytes'] = outputSize(output, settings)
+    except Exception:
+        result['error'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run(manifestPath, summaryPath=None):
+    if(summaryPath == None):
+        summaryPath = os.path.splitext(manifestPath)[0] + '.summary.json'
+    manifest = loadManifest(manifestPath)
+    baseDir = os.path.dirname(os.path.abspath(manifestPath))
+    sharedSettings = manifest.get('settings')
+
+    start = time.perf_counter()
+    results = []
+    for asset in manifest['assets']:
+        result = exportAsset(asset, baseDir, sharedSettings)
+        if(result['error'] != None):
+            print('FAILED {}\n{}'.format(result['input'], result['error']))
+        else:
+            print('exported {} -> {} ({} bytes, {:.2f}s)'.format(result['input'], result['output'], result['bytes'], result['seconds']))
+        results.append(result)
+
+    failed = len([ r for r in results if r['error'] != None ])
+    summary = {
+        'manifest': os.path.abspath(manifestPath),
+        'seconds': time.perf_counter() - start,
+        'exported': len(results) - failed,
+        'failed': failed,
+        'assets': results,
+    }
+    with open(summaryPath, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return failed
+
+if(__name__ == '__main__'):
+    args = scriptArgs(sys.argv)
+    if(len(args) < 1 or len(args) > 2):
+        print('usage: blender --background --python batch_export.py -- manifest.json [summary.json]')
+        sys.exit(2)
+    sys.exit(1 if run(*args) != 0 else 0)
@@ -1,32 +1,23 @@
 import bpy
 import numpy
-import mathutils
-from enum import Enum
-from mathutils import Matrix, Quaternion, Vector
-import xml.etree.ElementTree as ET
+from mathutils import Matrix
+from .dae_writer import DAEWriter, SourceType, DataType, Param, addInputBlock, buildSource, buildFloatSource, buildIntSource, buildRangeSource, chunkedJoin, renderFragment
+from .fragment_cache import FragmentCache, contentHash
+from .fragments import ControllerData, writeController, writeGeometry, renderTask
+from .anim_arrays import keyframeCoords, evaluateChannels, composeMatrices, reduceKeys, vertexPathIndex, shapeKeyDeltas, sparseDeltas
+from .mesh_arrays import extractMeshArrays, extractSkinArrays, buildVertexBuffers, meshSummary
+from .numeric_text import floatsToText
+from .profiler import ExportProfiler, NullProfiler
+from .settings import ExportSettings
+from .sidecar import SidecarWriter
+from .simplify import simplifyBuffers
+from .vertex_cache import optimizeVertexCache
 
+import collections
+import io
+import math
+import multiprocessing
 import os
-os.system('cls')
-
-mesh_targets = {}
-controller_targets = {}
-images = {}
-
-class SourceType(Enum):
-    Name_array = 0
-    float_array = 1
-
-class DataType(Enum):
-    string = 0
-    float = 1
-    float4x4 = 2
-
-class Param:
-    name = ''
-    type = DataType.string
-    def __init__(self, n, t):
-        self.name = n
-        self.type = t
 
 class AnimeChs:
     def __init__(self):
@@ -34,465 +25,750 @@ class AnimeChs:
         self.quatChs = []
         self.scaleChs = []
             
-def addInputBlock(domNode, semantic, source, offset=None):
-    input = ET.SubElement(domNode, 'input')
-    input.set('semantic', semantic)
-    input.set('source', source)
-    if(offset != None):
-        input.set('offset', str(offset))
-        
-def buildSource(domNode, strdata, count, id, params, sourceType=SourceType.float_array):
-    sourceNode = ET.SubElement(domNode, 'source')
-    sourceNode.set('id', id)
-    data = ET.SubElement(sourceNode, sourceType.name)
-
-    data.set('id', id + '.data')
-    data.set('count', str(count))
-    data.text = strdata
-    
-    techcom = ET.SubElement(sourceNode, 'technique_common')
-    accessor = ET.SubElement(techcom, 'accessor')
-    accessor.set('source', '#' + id + '.data')
-    stride = 0
-    for p in params:
-        t = p.type
-        param = ET.SubElement(accessor, 'param')
-        param.set('name', p.name)
-        param.set('type', t.name)
-        if( t == DataType.string or t == DataType.float):
-            stride += 1
-        elif ( t == DataType.float4x4 ):
-            stride += 16
-    if(stride != 0):
-        accessor.set('count', str(int(count/stride)))
-        accessor.set('stride', str(stride))
-
-def matrixToStrList(mat, transpose):
-    if(transpose):
-        mat.transpose()
-    vals = numpy.asarray(mat).ravel()
-    matText = ' '.join( "{:.4f}".format(x) for x in vals )
-    return matText
-
-def loadBonesTree( root, domNode, namebase ):
-    boneStack = []
-    domStack = []
-    boneStack.append(root)
-    domStack.append(domNode)
-    
-    while len(boneStack) != 0:
-        cb = boneStack.pop()
-        dom = domStack.pop()
-        
-        name = cb.name
-        dom.set('id', namebase + '.' + name)
-        dom.set('sid', name)
-        dom.set('type', 'JOINT')
-        
-        matrix = ET.SubElement(dom, 'matrix')
-        matrix.set('sid', 'LOCALBINDING')
-        matrixInv = ET.SubElement(dom, 'matrix')
-        matrixInv.set('sid', 'INVBINDING')
-        
-        parentMatInv = Matrix.Identity(4)
-        if(cb.parent != None):
-            parentMatInv = cb.parent.matrix_local.copy()
-            parentMatInv.invert()
-            
-        localMat = cb.matrix_local.copy();
-        mat = parentMatInv * localMat
-        localMat.invert()
-        
-        matrix.text = matrixToStrList(mat, True)
-        matrixInv.text = matrixToStrList(localMat, True)
-        for c in cb.children:
-            dc = ET.SubElement(dom, 'node')
-            boneStack.append(c)
-            domStack.append(dc)
-    
-def loadNodeArmature(obj, domNode):
-    armature = obj.data   
-    matText = matrixToStrList(obj.matrix_world.copy(), True)
-    matNode = ET.SubElement(domNode, 'matrix')
-    matNode.text = matText
-    
-    roots = []
-    bones = armature.bones
-    for b in bones:
-        if(b.parent == None):
-            roots.append(b)
-    for r in roots:
-        boneRoot = ET.SubElement(domNode, 'node')
-        loadBonesTree(r, boneRoot, obj.name)
-    
-def loadNodeMesh(obj, domNode ):
-    matText = matrixToStrList(obj.matrix_world.copy(), True)
-    matNode = ET.SubElement(domNode, 'matrix')
-    matNode.text = matText
-    
-    mesh = obj.data
-    mesh_targets[mesh.name] = mesh
-    instGeo = ET.SubElement(domNode, 'instance_geometry')
-    instGeo.set('url', '#' + mesh.name)
-    
-    for m in obj.modifiers:
-        id = m.name + '.' + obj.name + '.skin'
-        instCtrl = ET.SubElement(domNode, 'instance_controller')
-        instCtrl.set('url',  '#' + id)
-        ctrlMeta = { 'object': obj, 'mesh': mesh,  'modifier': m}
-        controller_targets[id] = ctrlMeta
-
-def loadLibControllers( lib_controllers ):
-    for c in controller_targets:
-        meta = controller_targets[c]
-        obj = meta['object']
-        mesh = meta['mesh']
-        modifier = meta['modifier'].object
-        
-        vGroups = obj.vertex_groups
-        sourceName_0 = c + '.groups'
-        vertGroups = []
-        for vg in vGroups:
-             vertGroups.append(vg.name)
-        bonesNameList = ' '.join( n for n in vertGroups)
- 
-        weightDictionary = {}
-        weights = []
-        vcount = []
-        v = []
+def writtenBytes( writer ):
+    if(writer.sidecar != None):
+        return writer.written + writer.sidecar.offset
+    return writer.written
+
+def recordCounts( record, data ):
+    for name, value in data.counts():
+        record.count(name, value)
+
+# Id of the reduced detail version of a geometry or controller.
+def lodId( id, level ):
+    return id + '.lod' + str(level)
+
+# Workers are always spawned: forking a running Blender is not safe, and on
+# older versions sys.executable is Blender itself, not its Python.
+def createWorkerPool( count ):
+    context = multiprocessing.get_context('spawn')
+    python = getattr(bpy.app, 'binary_path_python', None)
+    if(python):
+        context.set_executable(python)
+    return context.Pool(count)
+
+# Everything one export needs to remember: the settings, the meshes and
+# controllers found in the visual scene, the cache, worker pool and
+# profiler. Nothing lives at module level, so any number of exports can run
+# in one process, even at the same time; release() drops the references to
+# Blender data once an export is done.
+class ExportSession:
+    def __init__(self, settings=None):
+        self.settings = settings if settings != None else ExportSettings()
+        self.mesh_targets = {}
+        self.controller_targets = {}
+        self.images = {}
+        # geometry id -> blender vertex of every written geometry vertex
+        self.vertex_sources = {}
+        # mesh name -> id of the geometry written for it; hash of a mesh's
+        # meshSummary -> [full content hash or None, geometry id] of every
+        # geometry written with that summary; arrays extracted to tell
+        # geometries apart, kept until geometryJobs writes them
+        self.geometry_ids = {}
+        self.mesh_fingerprints = {}
+        self.extracted_arrays = {}
+        # geometry id -> (ACMR before, ACMR after) of the vertex cache pass
+        self.cache_ratios = {}
+        # geometry id -> triangles of the geometry and of each of its LODs
+        self.lod_triangles = {}
+        # (animation id, name, first key, last key) of every exported clip
+        self.animation_clips = []
+        self.fragment_cache = None
+        self.worker_pool = None
+        self.profiler = NullProfiler()
+
+    def release(self):
+        self.mesh_targets = {}
+        self.controller_targets = {}
+        self.images = {}
+        self.vertex_sources = {}
+        self.geometry_ids = {}
+        self.mesh_fingerprints = {}
+        self.extracted_arrays = {}
+        self.cache_ratios = {}
+        self.lod_triangles = {}
+        self.animation_clips = []
+        self.fragment_cache = None
+        self.profiler = NullProfiler()
+
+    def matrixToStrList(self, mat, transpose):
+        if(transpose):
+            mat.transpose()
+        vals = numpy.asarray(mat).ravel()
+        matText = floatsToText(vals, self.settings.precision, self.settings.trimZeros)
+        return matText
+
+    def loadBonesTree( self, root, writer, namebase ):
+        boneStack = []
+        boneStack.append(root)
+
+        while len(boneStack) != 0:
+            cb = boneStack.pop()
+            if(cb == None):
+                writer.end()
+                continue
+
+            name = cb.name
+            writer.start('node', [('id', namebase + '.' + name), ('sid', name), ('type', 'JOINT')])
+
+            parentMatInv = Matrix.Identity(4)
+            if(cb.parent != None):
+                parentMatInv = cb.parent.matrix_local.copy()
+                parentMatInv.invert()
+
+            localMat = cb.matrix_local.copy();
+            mat = parentMatInv * localMat
+            localMat.invert()
+
+            writer.element('matrix', [('sid', 'LOCALBINDING')], self.matrixToStrList(mat, True))
+            writer.element('matrix', [('sid', 'INVBINDING')], self.matrixToStrList(localMat, True))
+            # None closes the node once all of its children have been written.
+            boneStack.append(None)
+            for c in reversed(cb.children):
+                boneStack.append(c)
+
+    def loadNodeArmature(self, obj, writer):
+        armature = obj.data   
+        matText = self.matrixToStrList(obj.matrix_world.copy(), True)
+        writer.element('matrix', None, matText)
+
+        roots = []
+        bones = armature.bones
+        for b in bones:
+            if(b.parent == None):
+                roots.append(b)
+        for r in roots:
+            self.loadBonesTree(r, writer, obj.name)
+
+    def loadNodeMesh(self, obj, writer ):
+        matText = self.matrixToStrList(obj.matrix_world.copy(), True)
+        writer.element('matrix', None, matText)
+
+        mesh = obj.data
+        geometryId = self.geometryFor(mesh)
+        writer.element('instance_geometry', [('url', '#' + geometryId)])
+
+        controllerIds = []
+        for m in obj.modifiers:
+            id = m.name + '.' + obj.name + '.skin'
+            writer.element('instance_controller', [('url',  '#' + id)])
+            ctrlMeta = { 'object': obj, 'mesh': mesh, 'geometry': geometryId, 'modifier': m}
+            self.controller_targets[id] = ctrlMeta
+            controllerIds.append(id)
+
+        # COLLADA has no level of detail, so the reduced geometries (and
+        # controllers skinning them) are listed in a technique of their own.
+        if(len(self.settings.lodRatios) != 0):
+            writer.start('extra')
+            writer.start('technique', [('profile', 'LOD')])
+            for level, ratio in enumerate(self.settings.lodRatios, 1):
+                writer.start('lod', [('level', str(level)), ('ratio', str(ratio))])
+                writer.element('instance_geometry', [('url', '#' + lodId(geometryId, level))])
+                for id in controllerIds:
+                    writer.element('instance_controller', [('url', '#' + lodId(id, level))])
+                writer.end()
+            writer.end()
+            writer.end()
+
+    # Id of the geometry a mesh is written as. With instancing, meshes whose
+    # arrays hash the same as an earlier mesh's share its geometry, whatever
+    # they are called; only the first of them is written.
+    def geometryFor( self, mesh ):
+        if(mesh.name in self.geometry_ids):
+            return self.geometry_ids[mesh.name]
+        geometryId = mesh.name
+        if(self.settings.instanceGeometry):
+            geometryId = self.matchGeometry(mesh)
+        self.geometry_ids[mesh.name] = geometryId
+        if(geometryId == mesh.name):
+            self.mesh_targets[mesh.name] = mesh
+        return geometryId
+
+    # Meshes are first told apart by the hash of their meshSummary. Only
+    # when that matches an earlier geometry are both extracted and hashed
+    # in full; the arrays of a geometry extracted here are handed on to
+    # geometryJobs instead of being read a second time.
+    def matchGeometry( self, mesh ):
+        candidates = self.mesh_fingerprints.setdefault(contentHash(*meshSummary(mesh)), [])
+        if(len(candidates) == 0):
+            candidates.append([None, mesh.name])
+            return mesh.name
+        splitNormals = self.settings.normals == 'SPLIT'
+        for candidate in candidates:
+            if(candidate[0] == None):
+                arrays = self.extracted_arrays[candidate[1]] = extractMeshArrays(self.mesh_targets[candidate[1]], splitNormals)
+                candidate[0] = contentHash(*arrays.hashParts())
+        arrays = extractMeshArrays(mesh, splitNormals)
+        fullHash = contentHash(*arrays.hashParts())
+        for candidate in candidates:
+            if(candidate[0] == fullHash):
+                return candidate[1]
+        candidates.append([fullHash, mesh.name])
+        self.extracted_arrays[mesh.name] = arrays
+        return mesh.name
+
+    # (id, key, data) of a job keyed on its own data: with a cache, the
+    # fragment stored under the key takes the place of data when there is
+    # one. key is None when fragments are not cached.
+    def cachedJob( self, cache, kind, id, depth, data ):
+        if(cache == None):
+            return id, None, data
+        key = cache.key(kind, id, self.settings.outputKey(), depth, *data.hashParts())
+        fragment = cache.get(key)
+        return id, key, fragment if fragment != None else data
+
+    def controllerJobs( self, cache, depth ):
+        for c in self.controller_targets:
+            meta = self.controller_targets[c]
+            with self.profiler.item('controller.extract', c):
+                skin = extractSkinArrays(meta['object'], meta['mesh'])
+            bindShapeMatrix = numpy.asarray(meta['object'].matrix_local, dtype=numpy.float32)
+            sourceVertices = self.vertex_sources[meta['geometry']]
+            yield self.cachedJob(cache, 'controller', c, depth, ControllerData(meta['modifier'].object.name, meta['geometry'], bindShapeMatrix, skin, sourceVertices))
+            # The LODs keep a subset of the geometry's vertices, so they are
+            # skinned by the same weights through their own vertex mapping.
+            for level in range(1, len(self.settings.lodRatios) + 1):
+                geometryId = lodId(meta['geometry'], level)
+                sourceVertices = self.vertex_sources[geometryId]
+                yield self.cachedJob(cache, 'controller', lodId(c, level), depth, ControllerData(meta['modifier'].object.name, geometryId, bindShapeMatrix, skin, sourceVertices))
+
+    # The vertex buffers of a geometry and then of its LODs, simplified from
+    # it in turn, as (id, buffers).
+    def vertexBuffers( self, g, arrays ):
+        settings = self.settings
+        with self.profiler.item('geometry.build', g):
+            buffers = buildVertexBuffers(arrays)
+            if(settings.optimizeVertexCache):
+                self.cache_ratios[g] = optimizeVertexCache(buffers, settings.vertexCacheSize)
+        yield g, buffers
+
+        # Flat normals split every vertex, so the simplified base is
+        # welded on uvs alone and the LODs get face normals back.
+        base = buffers
+        if(len(settings.lodRatios) != 0 and settings.normals == 'FLAT'):
+            base = buildVertexBuffers(arrays, False)
+        for level, ratio in enumerate(settings.lodRatios, 1):
+            id = lodId(g, level)
+            with self.profiler.item('geometry.simplify', id):
+                lod = simplifyBuffers(base, ratio, settings.normals == 'FLAT')
+                if(settings.optimizeVertexCache):
+                    self.cache_ratios[id] = optimizeVertexCache(lod, settings.vertexCacheSize)
+            yield id, lod
+
+    # What the rest of the export needs of a written geometry besides its
+    # text: the blender vertex of every vertex (controllers and vertex
+    # animation map through it), its triangle count and vertex cache ratios.
+    # Stored next to cached geometries and restored from there on a hit.
+    def geometryExtras( self, id, buffers ):
+        extras = {'sourceVertices': buffers.sourceVertices, 'triangles': numpy.array([len(buffers.indices) // 3])}
+        if(id in self.cache_ratios):
+            extras['cacheRatios'] = numpy.array(self.cache_ratios[id])
+        return extras
+
+    def useGeometryExtras( self, g, id, extras ):
+        self.vertex_sources[id] = extras['sourceVertices']
+        if(len(self.settings.lodRatios) != 0):
+            self.lod_triangles.setdefault(g, []).append(int(extras['triangles'][0]))
+        if('cacheRatios' in extras):
+            self.cache_ratios[id] = tuple(extras['cacheRatios'].tolist())
+
+    # The vertex buffers are built here rather than on the workers because
+    # the controllers need their vertex mapping too. Every geometry is
+    # followed by its LODs. With a cache they are all keyed on the mesh's
+    # own arrays, so when every one of them is cached no vertex buffer is
+    # built, and neither the vertex cache pass nor simplification runs.
+    def geometryJobs( self, cache, depth ):
+        settings = self.settings
+        for g in self.mesh_targets:
+            with self.profiler.item('geometry.extract', g):
+                arrays = self.extracted_arrays.pop(g, None)
+                if(arrays == None):
+                    arrays = extractMeshArrays(self.mesh_targets[g], settings.normals == 'SPLIT')
+            ids = [g] + [ lodId(g, level) for level in range(1, len(settings.lodRatios) + 1) ]
+            keys = [None] * len(ids)
+            cached = [None] * len(ids)
+            if(cache != None):
+                parts = arrays.hashParts()
+                for i, id in enumerate(ids):
+                    keys[i] = cache.key('geometry', id, settings.outputKey(), depth, *parts)
+                    cached[i] = cache.get(keys[i], True)
+            if(None not in cached):
+                for id, key, (fragment, extras) in zip(ids, keys, cached):
+                    self.useGeometryExtras(g, id, extras)
+                    yield id, key, fragment
+                continue
+
+            for (id, buffers), key, hit in zip(self.vertexBuffers(g, arrays), keys, cached):
+                extras = self.geometryExtras(id, buffers)
+                self.useGeometryExtras(g, id, extras)
+                if(hit != None):
+                    yield id, key, hit[0]
+                    continue
+                if(key != None):
+                    cache.putArrays(key, extras)
+                yield id, key, buffers
+
+    # Sidecar offsets are only known while writing in file order, so
+    # fragments are not cached in that mode.
+    def jobCache( self, writer ):
+        return self.fragment_cache if writer.sidecar == None else None
+
+    def loadLibControllers( self, writer ):
+        self.writeFragments(writer, 'controller', self.controllerJobs(self.jobCache(writer), writer.depth), writeController)
+
+    # Returns the size of every written geometry.
+    def loadLibGeometries( self, writer ):
+        return self.writeFragments(writer, 'geometry', self.geometryJobs(self.jobCache(writer), writer.depth), writeGeometry)
+
+    # jobs yields (id, key, data) triples. data is either a fragment the job
+    # found in the cache, or what write(writer, id, data, settings) writes,
+    # in which case the fragment is stored under key unless that is None.
+    # Fragments are written directly, or rendered on the worker pool when
+    # there is one. Either way they end up in the file in job order, so the
+    # output does not depend on the number of workers.
+    #
+    # Returns how many bytes (text plus sidecar) every fragment took.
+    def writeFragments( self, writer, kind, jobs, write ):
+        sizes = {}
+        if(self.worker_pool == None):
+            for id, key, data in jobs:
+                with self.profiler.item(kind, id) as record:
+                    if(isinstance(data, str)):
+                        writer.raw(data)
+                        sizes[id] = len(data)
+                        continue
+                    recordCounts(record, data)
+                    if(key == None):
+                        writer.closePending()
+                        before = writtenBytes(writer)
+                        write(writer, id, data, self.settings)
+                        sizes[id] = writtenBytes(writer) - before
+                        continue
+                    fragment = renderFragment(writer, write, id, data, self.settings)
+                    self.fragment_cache.put(key, fragment)
+                    writer.raw(fragment)
+                    sizes[id] = len(fragment)
+            return sizes
+
+        # Jobs are pulled (and their arrays extracted) only while fewer than
+        # two per worker are in flight, so memory stays bounded by the window
+        # rather than by the scene. Profiled objects only show the time spent
+        # in this process: submitting and waiting for the window.
+        window = collections.deque()
+        for id, key, data in jobs:
+            with self.profiler.item(kind, id) as record:
+                fragment = data
+                if(not isinstance(data, str)):
+                    recordCounts(record, data)
+                    fragment = self.worker_pool.apply_async(renderTask, ((write, id, data, self.settings, writer.indent, writer.depth),))
+                window.append((id, key, fragment))
+                if(len(window) >= 2 * self.settings.workers):
+                    self.writePooledFragment(writer, window.popleft(), sizes)
+        while len(window) != 0:
+            self.writePooledFragment(writer, window.popleft(), sizes)
+        return sizes
+
+    def writePooledFragment( self, writer, entry, sizes ):
+        id, key, fragment = entry
+        if(not isinstance(fragment, str)):
+            fragment = fragment.get()
+            if(key != None):
+                self.fragment_cache.put(key, fragment)
+        writer.raw(fragment)
+        sizes[id] = len(fragment)
+
+    def loadLibVisualScene( self, writer ):
+        objscene = bpy.data.scenes[0]
+        writer.start('visual_scene')
+        objs = objscene.objects
+        for obj in objs:
+            objName = obj.name
+            objType = obj.type
+            writer.start('node', [('id', objName), ('obj_type', objType), ('type', 'NODE')])
+            if(obj.type == 'MESH'):
+                self.loadNodeMesh(obj, writer)
+            elif(obj.type == 'ARMATURE'):
+                self.loadNodeArmature(obj, writer)
+            writer.end()
+        writer.end()
+
+    # Writes the sources, samplers and channels of one clip, every id prefixed
+    # with clipId. Returns how many keys the reduction pass removed; bones,
+    # channels, written keys and distinct timelines are counted into record.
+    def buildAnimation( self, writer, clipId, action, armature, record ):
+        actionIDRoot = action.id_root
+
+        if (actionIDRoot == 'OBJECT'):
+            channels = action.fcurves
+            boneTimeSets = {}
+            boneTimelines = {}
+            boneAnimes = {}
+            for ch in channels:
+                rna = ch.data_path
+                f0 = rna.find('\"') + 1
+                f1 = rna.find('\"', f0)
+                boneName = rna[f0:f1]
+                locRotScalType = rna.split('.')[-1]
+
+                bone = armature.bones[boneName]
+
+                if(boneName not in boneTimeSets):
+                    boneTimeSets[boneName] = []
+                boneTimeSets[boneName].append(keyframeCoords(ch)[:, 0])
+
+                if(boneName not in boneAnimes):
+                    boneAnimes[boneName] = AnimeChs()
+                boneAnime = boneAnimes[boneName]
+
+                if(locRotScalType == 'rotation_quaternion'):
+                    boneAnime.quatChs.append(ch)
+                elif(locRotScalType == 'location'):
+                    boneAnime.locChs.append(ch)
+                elif(locRotScalType == 'scale'):
+                    boneAnime.scaleChs.append(ch)
+
+            # Every channel of a bone is evaluated over the whole timeline at
+            # once and the key matrices are composed as one N x 4 x 4 stack.
+            boneFCurves = {}
+            keysRemoved = 0
+            for bn in boneAnimes:
+                abone = armature.bones[bn]
+                connect = abone.use_connect
+
+                timeline = numpy.unique(numpy.concatenate(boneTimeSets[bn]).astype(numpy.float64))
+                boneTimelines[bn] = timeline
+
+                boneAnime = boneAnimes[bn]
+                location = None
+                quaternion = None
+                scale = None
+                if(not connect and len(boneAnime.locChs) == 3):
+                    location = evaluateChannels(boneAnime.locChs, timeline)
+                if(len(boneAnime.quatChs) == 4):
+                    quaternion = evaluateChannels(boneAnime.quatChs, timeline)
+                if(len(boneAnime.scaleChs) == 3):
+                    scale = evaluateChannels(boneAnime.scaleChs, timeline)
+                record.count('bones', 1)
+                record.count('channels', len(boneAnime.locChs) + len(boneAnime.quatChs) + len(boneAnime.scaleChs))
+                mats = composeMatrices(len(timeline), location, quaternion, scale)
+                if(self.settings.reduceKeys):
+                    kept = reduceKeys(timeline, mats, self.settings.keyPositionError,
+                        math.radians(self.settings.keyRotationError), self.settings.keyScaleError)
+                    keysRemoved += len(timeline) - len(kept)
+                    timeline = timeline[kept]
+                    boneTimelines[bn] = timeline
+                    mats = mats[kept]
+                boneFCurves[bn] = mats
+                record.count('keys', len(timeline))
+
+            # Bones keyed at the same times share one timeline source, and
+            # timelines of the same length one interpolation source. All
+            # sources come first, then the samplers, then the channels.
+            timelineIds = {}
+            interpolationIds = {}
+            samplers = []
+            for bn in boneFCurves:
+                timeline = boneTimelines[bn]
+                timelineId = timelineIds.get(timeline.tobytes())
+                if(timelineId == None):
+                    timelineId = clipId + '.timeline' + str(len(timelineIds))
+                    timelineIds[timeline.tobytes()] = timelineId
+                    buildFloatSource(writer, timeline, timelineId,
+                        [ Param('TIME',DataType.float) ], self.settings.precision, self.settings.trimZeros)
+
+                transMats = boneFCurves[bn]
+                transformName = clipId + '.' + bn + '.transform'
+                buildFloatSource(writer, transMats.transpose(0, 2, 1), transformName,
+                    [ Param('TRANSFORM',DataType.float4x4) ], self.settings.precision, self.settings.trimZeros)
+
+                interpoName = interpolationIds.get(len(timeline))
+                if(interpoName == None):
+                    interpoName = clipId + '.interpolation' + str(len(interpolationIds))
+                    interpolationIds[len(timeline)] = interpoName
+                    interpolation = ['LINEAR'] * len(timeline)
+                    buildSource(writer, chunkedJoin(interpolation, "{}"), len(interpolation), interpoName,
+                        [ Param('INTERPOLATION',DataType.string) ], SourceType.Name_array)
+                samplers.append((bn, clipId + '.' + bn + '.sampler', timelineId, transformName, interpoName))
+            record.count('timelines', len(timelineIds))
+
+            for bn, samplerID, timelineId, transformName, interpoName in samplers:
+                writer.start('sampler', [('id', samplerID)])
+                addInputBlock(writer, 'INPUT', '#' + timelineId)
+                addInputBlock(writer, 'OUTPUT', '#' + transformName)
+                addInputBlock(writer, 'INTERPOLATION', '#' + interpoName)
+                writer.end()
+            for bn, samplerID, timelineId, transformName, interpoName in samplers:
+                writer.element('channel', [('source', '#' + samplerID), ('target', bn + '/transform')])
+
+            if(len(boneTimelines) != 0):
+                first = min( float(t[0]) for t in boneTimelines.values() if len(t) != 0 )
+                last = max( float(t[-1]) for t in boneTimelines.values() if len(t) != 0 )
+                self.animation_clips.append((clipId, action.name, first, last))
+            return keysRemoved
+        return 0
+
+    # (id, action) of every clip of an object: each strip of each NLA track,
+    # then the active action unless a strip already plays it.
+    def animationClips( self, objName, animData ):
+        clips = []
+        actions = []
+        for tra in animData.nla_tracks:
+            for strip in tra.strips:
+                if(strip.action != None):
+                    clips.append((objName + '.' + tra.name + '.' + strip.name, strip.action))
+                    actions.append(strip.action)
+        if(animData.action != None and animData.action not in actions):
+            clips.append((objName + '.' + animData.action.name, animData.action))
+        return clips
+
+    # (timeline, vertices, deltas) of a MESH action keying vertices[i].co or
+    # a KEY action keying relative shape key values: the vertices the action
+    # may move and their F x len(vertices) x 3 deltas from the rest
+    # positions. Returns None for actions without such keys.
+    def vertexActionDeltas( self, action, mesh ):
+        if(action.id_root == 'MESH'):
+            channels = [ ch for ch in action.fcurves if vertexPathIndex(ch.data_path) != None ]
+        elif(action.id_root == 'KEY' and mesh.shape_keys != None):
+            channels = [ ch for ch in action.fcurves if ch.data_path.startswith('key_blocks[') and ch.data_path.endswith('.value') ]
+        else:
+            return None
+        if(len(channels) == 0):
+            return None
+        timeline = numpy.unique(numpy.concatenate([ keyframeCoords(ch)[:, 0] for ch in channels ]).astype(numpy.float64))
+        values = evaluateChannels(channels, timeline)
+
+        rest = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+        mesh.vertices.foreach_get('co', rest)
+        rest = rest.reshape(-1, 3)
+        if(action.id_root == 'MESH'):
+            indices = numpy.array([ vertexPathIndex(ch.data_path) for ch in channels ], dtype=numpy.int64)
+            vertices, columns = numpy.unique(indices, return_inverse=True)
+            positions = numpy.repeat(rest[vertices][None, :, :].astype(numpy.float64), len(timeline), axis=0)
+            for i, ch in enumerate(channels):
+                positions[:, columns[i], ch.array_index] = values[:, i]
+            return timeline, vertices, positions - rest[vertices]
+
+        # Every unmuted key but the reference one, weighted by its fcurve
+        # or, without one, by its current value.
+        key = mesh.shape_keys
+        animated = {}
+        for i, ch in enumerate(channels):
+            f0 = ch.data_path.find('\"') + 1
+            animated[ch.data_path[f0:ch.data_path.find('\"', f0)]] = values[:, i]
+        blocks = [ kb for kb in key.key_blocks if kb.name != key.reference_key.name and not kb.mute ]
+        weights = numpy.empty((len(timeline), len(blocks)), dtype=numpy.float64)
+        offsets = numpy.empty((len(blocks), len(rest), 3), dtype=numpy.float64)
+        co = numpy.empty(len(rest) * 3, dtype=numpy.float32)
+        for k, kb in enumerate(blocks):
+            weights[:, k] = animated.get(kb.name, kb.value)
+            kb.data.foreach_get('co', co)
+            offsets[k] = co.reshape(-1, 3)
+            kb.relative_key.data.foreach_get('co', co)
+            offsets[k] -= co.reshape(-1, 3)
+        vertices = numpy.nonzero(numpy.any(offsets != 0.0, axis=(0, 2)))[0]
+        return timeline, vertices, shapeKeyDeltas(weights, offsets[:, vertices])
+
+    # Sparse vertex animation of one clip: only the vertices the clip moves
+    # further than vertexDeltaThreshold are written, as deltas from the rest
+    # positions, one row of len(vertices) x 3 values per key:
+    #
+    #   <clip>.vertices  (VERTEX, ROW) pairs: the geometry vertex and the
+    #                    delta row it follows
+    #   <clip>.deltas    F x len(rows) x 3 deltas, or with
+    #                    quantizeVertexDeltas 16 bit integers over the clip's
+    #                    range (see quantize.py)
+    #
+    # The sampler takes the pairs as an extra VERTEX input; a channel targets
+    # <object>/vertices of every object using the mesh.
+    def buildVertexAnimation( self, writer, clipId, action, mesh, users, record ):
+        animation = self.vertexActionDeltas(action, mesh)
+        if(animation == None):
+            return
+        timeline, vertices, deltas = animation
+        vertices, deltas = sparseDeltas(vertices, deltas, self.settings.vertexDeltaThreshold)
+        sourceVertices = self.vertex_sources[self.geometry_ids[mesh.name]]
+        rowOf = numpy.full(len(mesh.vertices), -1, dtype=numpy.int64)
+        rowOf[vertices] = numpy.arange(len(vertices))
+        rows = rowOf[sourceVertices]
+        targets = numpy.nonzero(rows >= 0)[0]
+        record.count('keys', len(timeline))
+        record.count('vertices', len(vertices))
+        record.count('targets', len(targets))
+
+        timelineId = clipId + '.timeline0'
+        buildFloatSource(writer, timeline, timelineId,
+            [ Param('TIME',DataType.float) ], self.settings.precision, self.settings.trimZeros)
+        pairsId = clipId + '.vertices'
+        buildIntSource(writer, numpy.column_stack((targets, rows[targets])), pairsId,
+            [ Param('VERTEX',DataType.int), Param('ROW',DataType.int) ])
+        deltasId = clipId + '.deltas'
+        if(self.settings.quantizeVertexDeltas):
+            buildRangeSource(writer, deltas.reshape(-1, 3), deltasId, ['X', 'Y', 'Z'], True)
+        else:
+            buildFloatSource(writer, deltas, deltasId,
+                [ Param('X',DataType.float), Param('Y',DataType.float), Param('Z',DataType.float) ], self.settings.precision, self.settings.trimZeros)
+        interpoName = clipId + '.interpolation0'
+        interpolation = ['LINEAR'] * len(timeline)
+        buildSource(writer, chunkedJoin(interpolation, "{}"), len(interpolation), interpoName,
+            [ Param('INTERPOLATION',DataType.string) ], SourceType.Name_array)
+
+        samplerID = clipId + '.sampler'
+        writer.start('sampler', [('id', samplerID)])
+        addInputBlock(writer, 'INPUT', '#' + timelineId)
+        addInputBlock(writer, 'OUTPUT', '#' + deltasId)
+        addInputBlock(writer, 'INTERPOLATION', '#' + interpoName)
+        addInputBlock(writer, 'VERTEX', '#' + pairsId)
+        writer.end()
+        for objName in users:
+            writer.element('channel', [('source', '#' + samplerID), ('target', objName + '/vertices')])
+        if(len(timeline) != 0):
+            self.animation_clips.append((clipId, action.name, float(timeline[0]), float(timeline[-1])))
+
+    # Every NLA strip (and an active action no strip plays) is written as a
+    # clip of its own: armature actions as bone matrices, mesh and shape key
+    # actions as sparse vertex animation of each exported mesh.
+    # ONLY support linear matrix interpolation for smaller file size.              
+    def loadLibAnimations( self, writer ):
+        keysRemoved = 0
+        objscene = bpy.data.scenes[0]
+        objs = objscene.objects
+        meshUsers = collections.OrderedDict()
+        for obj in objs:
+            obj.update_from_editmode()
+            objName = obj.name
+            objType = obj.type
+
+            animData = None
+            if(objType == 'ARMATURE'):
+                animData = obj.animation_data
+            elif(objType == 'MESH' and obj.data.name in self.geometry_ids):
+                meshUsers.setdefault(obj.data.name, (obj.data, []))[1].append(objName)
+            if(animData != None):
+                for clipId, action in self.animationClips(objName, animData):
+                    writer.start('animation', [('id', clipId), ('name', action.name)])
+                    with self.profiler.item('animation', clipId) as record:
+                        keysRemoved += self.buildAnimation(writer, clipId, action, obj.data, record)
+                    writer.end()
+
+        for meshName in meshUsers:
+            mesh, users = meshUsers[meshName]
+            sources = [ (meshName, mesh.animation_data) ]
+            if(mesh.shape_keys != None):
+                sources.append((meshName + '.shape_keys', mesh.shape_keys.animation_data))
+            for prefix, animData in sources:
+                if(animData == None):
+                    continue
+                for clipId, action in self.animationClips(prefix, animData):
+                    writer.start('animation', [('id', clipId), ('name', action.name)])
+                    with self.profiler.item('animation', clipId) as record:
+                        self.buildVertexAnimation(writer, clipId, action, mesh, users, record)
+                    writer.end()
+        return keysRemoved
+
+    # One <animation_clip> per exported clip, spanning its keys.
+    def loadLibAnimationClips( self, writer ):
+        for clipId, name, first, last in self.animation_clips:
+            start, end = floatsToText(numpy.array([first, last]), self.settings.precision, self.settings.trimZeros).split()
+            writer.start('animation_clip', [('id', clipId + '.clip'), ('name', name), ('start', start), ('end', end)])
+            writer.element('instance_animation', [('url', '#' + clipId)])
+            writer.end()
+
+    # The visual scene is walked first because it decides which meshes and
+    # controllers are exported, but it is written last, so it goes through a
+    # small in-memory writer while everything else streams to the file.
+    #
+    # Returns a dict of export statistics (cache hits and misses, removed keys,
+    # the profile report path and summary).
+    def export( self, filepath ):
+        settings = self.settings
+        self.profiler = ExportProfiler(settings.profileMemory) if settings.profile else NullProfiler()
+        self.profiler.start()
+        if(settings.cacheDirectory != None):
+            self.fragment_cache = FragmentCache(settings.cacheDirectory, settings.cacheSize)
         
-        vertices = mesh.vertices
-        for vert in vertices:
-            vcount.append(len(vert.groups))
-            for g in vert.groups:         
-                if( g.weight not in weightDictionary ):
-                    weightDictionary[g.weight] = len(weights)
-                    weights.append(g.weight)
-                weightIndex = weightDictionary[g.weight]
-                v.append(g.group)
-                v.append(weightIndex)
-        sourceName_2 = c + '.skin.weights'
-        weightsStr = ' '.join( "{:.4f}".format(w) for w in weights)    
+        visualScene = io.StringIO()
+        try:
+            with self.profiler.stage('loadLibVisualScene'):
+                self.loadLibVisualScene(DAEWriter(visualScene, settings.indent, 2))
             
-        ctrl = ET.SubElement(lib_controllers, 'controller')
-        ctrl.set('id', c)
-        ctrl.set('name', modifier.name)
-        
-        skin = ET.SubElement(ctrl, 'skin')
-        skin.set('source', '#' + mesh.name)
-        
-        bsmat = ET.SubElement(skin, 'bind_shape_matrix')
-        object = meta['object'];
-        bsmat.text = matrixToStrList(object.matrix_local.copy(), True)
+            if(settings.workers > 1 and not settings.binarySidecar and len(self.mesh_targets) + len(self.controller_targets) > 1):
+                self.worker_pool = createWorkerPool(settings.workers)
+            keysRemoved, geometrySizes = self.writeDocument(filepath, visualScene.getvalue())
+        finally:
+            if(self.worker_pool != None):
+                self.worker_pool.terminate()
+                self.worker_pool = None
+            self.profiler.stop()
         
-        buildSource(skin, bonesNameList, len(vGroups), sourceName_0, [ Param('GROUPS',DataType.string) ], SourceType.Name_array)
-        buildSource(skin, weightsStr, len(weights), sourceName_2, [Param('WEIGHT',DataType.float)], SourceType.float_array)
-                 
-        vertexWeightDom = ET.SubElement(skin, 'vertex_weights')
-        vertexWeightDom.set('count', str(len(vcount)))
-        addInputBlock(vertexWeightDom, 'GROUPS', '#' + sourceName_0, 0)
-        addInputBlock(vertexWeightDom, 'WEIGHT', '#' + sourceName_2, 1)
-        
-        vcountDom = ET.SubElement(vertexWeightDom, 'vcount')
-        vcountDom.text = ' '.join(str(val) for val in vcount )
-        vDom = ET.SubElement(vertexWeightDom, 'v')
-        vDom.text = ' '.join(str(val) for val in v )
-
-def loadLibGeometries( lib_geometries ):
-    for g in mesh_targets:  
-        mesh = mesh_targets[g]
-        vertices = mesh.vertices
-        vertPosStrs = []
-        for v in vertices:
-            vertPosStrs.append(' '.join( "{:.4f}".format(val) for val in v.co ))
-        sourceNamePos = g + '.vertex.position'
-        vertStrData = ' '.join( str for str in vertPosStrs)
-        
-        loops = mesh.loops
-    
-        uvSet = 0
-        allUVCoordsName = []
-        allUVCoords = []
-        uvLayers = mesh.uv_layers
-        for uvLayer in uvLayers:
-            uvData = uvLayer.data
-            uvCoords = ['0.0 0.0'] * len(vertices)
-            for li in range(len(loops)):
-                vi = loops[li].vertex_index
-                uvCoords[vi] = ' '.join( "{:.4f}".format(val) for val in uvData[li].uv )
-            allUVCoordsName.append( g + '.uvlayer' + str(uvSet))
-            allUVCoords.append(uvCoords)
-            uvSet+=1
-
-        polygons = mesh.polygons
-        triangles = []
-        triangleNormals = []
-        for p in polygons:
-            nal = numpy.asarray(p.normal)
-            ni = len(triangleNormals)
-            triangleNormals.append(' '.join( "{:.4f}".format(val) for val in nal))
-            s = p.loop_start
-            if(p.loop_total == 3):                             
-                triangles.append( loops[s+0].vertex_index)
-                triangles.append(ni)
-                triangles.append( loops[s+1].vertex_index)
-                triangles.append(ni)
-                triangles.append( loops[s+2].vertex_index)
-                triangles.append(ni)
-            elif(p.loop_total == 4):
-                triangles.append( loops[s+0].vertex_index)
-                triangles.append(ni)
-                triangles.append( loops[s+1].vertex_index)
-                triangles.append(ni)
-                triangles.append( loops[s+2].vertex_index)               
-                triangles.append(ni)
-                triangles.append( loops[s+0].vertex_index)
-                triangles.append(ni)
-                triangles.append( loops[s+2].vertex_index)
-                triangles.append(ni)
-                triangles.append( loops[s+3].vertex_index)
-                triangles.append(ni)
-            else:
-                print('Plygon has to be triangles or quads...')
-                
-        sourceTriNormals = g + '.triangle.normals'
-        sourceTriNormalsData = ' '.join( str for str in triangleNormals)
-
-        geometry = ET.SubElement(lib_geometries, 'geometry')
-        geometry.set('id', g)
-        meshDom = ET.SubElement(geometry, 'mesh')        
-        buildSource(meshDom, vertStrData, len(vertices) * 3, sourceNamePos,
-            [ Param('x',DataType.float), Param('y',DataType.float), Param('z',DataType.float) ], SourceType.float_array)     
-        for i in range(len(allUVCoords)):
-            uvCoord = allUVCoords[i]
-            datum = ' '.join( str for str in uvCoord )
-            buildSource(meshDom, datum, len(allUVCoords[i]) * 2, allUVCoordsName[i],
-                [ Param('u',DataType.float), Param('v',DataType.float)], SourceType.float_array)
-        buildSource(meshDom, sourceTriNormalsData, len(triangleNormals) * 3, sourceTriNormals, 
-            [ Param('x',DataType.float), Param('y',DataType.float), Param('z',DataType.float) ], SourceType.float_array)
-        
-        verticesDom = ET.SubElement(meshDom, 'vertices')
-        verticesDomID = g + '.vertices'
-        verticesDom.set('id', verticesDomID)
-        vertexPosInput = ET.SubElement(verticesDom, 'input')
-        vertexPosInput.set('semantic', 'POSITION')
-        vertexPosInput.set('source', '#' + sourceNamePos)
-        for i in range(len(allUVCoords)):
-            vertexTexCoordInput = ET.SubElement(verticesDom, 'input')
-            vertexTexCoordInput.set('semantic', 'TEXCOORD' + str(i))
-            vertexTexCoordInput.set('source', '#' + allUVCoordsName[i])
-        
-        trianglesDom = ET.SubElement(meshDom, 'triangles')
-        trianglesDom.set('count', str(int(len(triangles)/3)))
-        
-        triangleInput = ET.SubElement(trianglesDom, 'input')
-        triangleInput.set('semantic', 'VERTEX')
-        triangleInput.set('source', '#' + verticesDomID)
-        triangleInput.set('offset', '0')
-        
-        triangleInput = ET.SubElement(trianglesDom, 'input')
-        triangleInput.set('semantic', 'NORMAL')
-        triangleInput.set('source', '#' + sourceTriNormals)
-        triangleInput.set('offset', '1')
-        
-        pData = ' '.join( str(v) for v in triangles)
-        pDom = ET.SubElement(trianglesDom, 'p')
-        pDom.text = pData
-        
-def loadLibVisualScene( lib_visual_scene ):
-    objscene = bpy.data.scenes[0]
-    domScene = ET.SubElement(lib_visual_scene, 'visual_scene')
-    objs = objscene.objects
-    for obj in objs:
-        objName = obj.name
-        objType = obj.type
-        domNode = ET.SubElement(domScene, 'node')
-        domNode.set('id', objName)
-        domNode.set('obj_type', objType)
-        domNode.set('type', 'NODE')   
-        if(obj.type == 'MESH'):
-            loadNodeMesh(obj, domNode)
-        elif(obj.type == 'ARMATURE'):
-            loadNodeArmature(obj, domNode)
-
-def buildAnimation( node, strip, armature ):
-    if(strip == None):
-        return;
-    action = strip.action
-    actionIDRoot = action.id_root
-
-    if(actionIDRoot == 'MESH'):
-        #print('Handle fcurve in MESH mode')
-        #1. pick up vertices that changes in the clip.
-        #2. build source, channel, sampler for each such vertex.
-        fcurves = action.fcurves
-        print('Build sources and channels for vertices ' + str(len(fcurves)))
-        print('Removing dead vertex is required.')
-    elif (actionIDRoot == 'OBJECT'):
-        channels = action.fcurves
-        boneTimeSets = {}
-        boneTimelines = {}
-        boneAnimes = {}
-        for ch in channels:
-            rna = ch.data_path
-            f0 = rna.find('\"') + 1
-            f1 = rna.find('\"', f0)
-            boneName = rna[f0:f1]
-            locRotScalType = rna.split('.')[-1]
-            
-            bone = armature.bones[boneName]
-               
-            if(boneName not in boneTimeSets):
-                boneTimeSets[boneName] = set()
-            kfpts = ch.keyframe_points
-            for kf in kfpts:
-                boneTimeSets[boneName].add(kf.co[0])
+        stats = {}
+        if(settings.instanceGeometry):
+            shared = [ g for m, g in self.geometry_ids.items() if m != g ]
+            stats['instancedMeshes'] = len(shared)
+            lods = range(1, len(settings.lodRatios) + 1)
+            stats['bytesSaved'] = sum( geometrySizes[g] + sum( geometrySizes[lodId(g, l)] for l in lods ) for g in shared )
+        if(len(settings.lodRatios) != 0):
+            stats['lodTriangles'] = self.lod_triangles
+        if(settings.optimizeVertexCache):
+            stats['vertexCache'] = self.cache_ratios
+        if(settings.reduceKeys):
+            stats['keysRemoved'] = keysRemoved
+        if(self.fragment_cache != None):
+            stats['cacheHits'] = self.fragment_cache.hits
+            stats['cacheMisses'] = self.fragment_cache.misses
+            stats['cacheEvicted'] = self.fragment_cache.evict()
+        if(settings.profile):
+            stats['profile'] = os.path.splitext(filepath)[0] + '.profile.json'
+            stats['profileSummary'] = self.profiler.summary()
+            self.profiler.write(stats['profile'])
+        return stats
+
+    def writeDocument( self, filepath, visualScene ):
+        sidecar = None
+        if(self.settings.binarySidecar):
+            sidecar = SidecarWriter(os.path.splitext(filepath)[0] + '.bin', self.settings.binaryThreshold)
+        try:
+            with open(filepath, 'w', encoding='utf-8', errors='xmlcharrefreplace') as f:
+                writer = DAEWriter(f, self.settings.indent, 0, sidecar)
+                writer.declaration()
+                writer.start('COLLADA', [('xmlns', 'http://www.collada.org/2005/11/COLLADASchema'), ('version', '1.5.0'),
+                    ('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')])
                 
-            if(boneName not in boneAnimes):
-                boneAnimes[boneName] = AnimeChs()
-            boneAnime = boneAnimes[boneName]
-            
-            if(locRotScalType == 'rotation_quaternion'):
-                boneAnime.quatChs.append(ch)
-            elif(locRotScalType == 'location'):
-                boneAnime.locChs.append(ch)
-            elif(locRotScalType == 'scale'):
-                boneAnime.scaleChs.append(ch)
-                     
-        boneFCurves = {}
-        boneInterpolations = {}
-        for bn in boneAnimes:
-            abone = armature.bones[bn]
-            connect = abone.use_connect
-            
-            timeline = list( boneTimeSets[bn])
-            timeline.sort()
-            boneTimelines[bn] = timeline
-            
-            boneAnime = boneAnimes[bn]
-            if(bn not in boneFCurves):
-                boneFCurves[bn] = []
-            boneMatStr = boneFCurves[bn]
-            
-            if(bn not in boneInterpolations):
-                boneInterpolations[bn] = []
-            boneInterpolation = boneInterpolations[bn]
-            
-            for tl in timeline:
-                location= []
-                quaternion = []
-                scale = []
-
-                if(not connect):
-                    for ch in boneAnime.locChs:
-                        location.append(ch.evaluate(tl))
-                for ch in boneAnime.quatChs:
-                    quaternion.append(ch.evaluate(tl))
-                for ch in boneAnime.scaleChs:
-                    scale.append(ch.evaluate(tl))
-                                 
-                matLoc = Matrix.Identity(4) if len(location) != 3 else Matrix.Translation( ( location[0], location[1], location[2]) )
-                matRot = Matrix.Identity(4) if len(quaternion) != 4 else Quaternion( (quaternion[0], quaternion[1], quaternion[2], quaternion[3]) ).to_matrix().to_4x4()
-                matScl = Matrix.Identity(4)
-                if( len(scale) == 3):
-                    matScl[0][0] = scale[0]
-                    matScl[1][1] = scale[1]
-                    matScl[2][2] = scale[2]
+                # Geometries go first: vertex animation refers to their
+                # vertex order.
+                with self.profiler.stage('loadLibGeometries'):
+                    writer.start('library_geometries')
+                    geometrySizes = self.loadLibGeometries(writer)
+                    writer.end()
+                with self.profiler.stage('loadLibControllers'):
+                    writer.start('library_controllers')
+                    self.loadLibControllers(writer)
+                    writer.end()
+                with self.profiler.stage('loadLibAnimations'):
+                    writer.start('library_animations')
+                    keysRemoved = self.loadLibAnimations(writer)
+                    writer.end()
+                    if(len(self.animation_clips) != 0):
+                        writer.start('library_animation_clips')
+                        self.loadLibAnimationClips(writer)
+                        writer.end()
+                with self.profiler.stage('writeVisualScene'):
+                    writer.start('library_visual_scenes')
+                    writer.raw(visualScene)
+                    writer.end()
                     
-                mat =  matRot * matScl * matLoc
-                matStrs = matrixToStrList(mat, True)
-                boneMatStr.append(matStrs)
-                boneInterpolation.append('LINEAR')
-            
-        for bn in boneFCurves:            
-            timeline = boneTimelines[bn]
-            timelineDatumName = bn + '.timeline'
-            datumTimeline = ' '.join( str(v) for v in timeline)
-            buildSource(node, datumTimeline, len(timeline), timelineDatumName,
-                [ Param('TIME',DataType.float) ], SourceType.float_array)
-            
-            transMats = boneFCurves[bn]
-            transformName = bn + '.transform'
-            datumTransform = ' '.join( v for v in transMats )
-            buildSource(node, datumTransform, len(transMats) * 16, transformName,
-                [ Param('TRANSFORM',DataType.float4x4) ], SourceType.float_array)
-            
-            interpolation = boneInterpolations[bn]
-            interpoName = bn + '.interpolation'
-            datumInterpo = ' '.join( v for v in interpolation )
-            buildSource(node, datumInterpo, len(interpolation), interpoName,
-                [ Param('INTERPOLATION',DataType.string) ], SourceType.Name_array)
-                
-            samplerID = bn + '.sampler'
-            sampler = ET.SubElement(node, 'sampler')
-            sampler.set('id', samplerID)
-            addInputBlock(sampler, 'INPUT', '#' + timelineDatumName)
-            addInputBlock(sampler, 'OUTPUT', '#' + transformName)
-            addInputBlock(sampler, 'INTERPOLATION', '#' + interpoName)
-            
-            channel = ET.SubElement(node, 'channel')
-            channel.set('source', '#' + samplerID)
-            channel.set('target', bn + '/transform')
-
-# DO NOT Support MESH animation yet.
-# ONLY support linear matrix interpolation for smaller file size.              
-def loadLibAnimations(lib_animations):
-    objscene = bpy.data.scenes[0]
-    objs = objscene.objects
-    for obj in objs:
-        obj.update_from_editmode()
-        objName = obj.name
-        objType = obj.type
-
-        animData = None
-        type = None
-        if(objType == 'ARMATURE'):
-            animData = obj.animation_data
-        #elif(objType == 'MESH' and obj.data.animation_data != None ):
-        #    animData = obj.data.animation_data
-        if(animData != None):
-            tracks = animData.nla_tracks
-            for tra in tracks:                
-                traNode = ET.SubElement(lib_animations, 'animation')
-                traNode.set('id', objName + '.' + tra.name)
-                strip = tra.strips[0]
-                buildAnimation(traNode, strip, obj.data)
-            
-def prettify( root ):
-    lvstack = []
-    elmstack = []
-    lvstack.append(0)
-    elmstack.append(root)
-    while len(elmstack) != 0:
-        lv = lvstack.pop()
-        p = elmstack.pop()
-        if(len(p) != 0 ):
-            p.text = '\n' + (lv + 1) * '\t'
-            for c in reversed(p):
-                c.tail = '\n' + (lv + 1) * '\t'
-                elmstack.append(c)
-                lvstack.append(lv + 1)
-            p[-1].tail = '\n' + lv * '\t'
-
-def export( context, filepath ):
-    collada = ET.Element('COLLADA')
-    collada.set('xmlns', 'http://www.collada.org/2005/11/COLLADASchema')
-    collada.set('version', '1.5.0')
-    collada.set('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
-    
-    lib_animations = ET.SubElement(collada, 'library_animations')
-    lib_geometries = ET.SubElement(collada, 'library_geometries')    
-    lib_controllers = ET.SubElement(collada, 'library_controllers')
-    lib_visual_sence = ET.SubElement(collada, 'library_visual_scenes')
-    
-    loadLibVisualScene(lib_visual_sence)
-    loadLibGeometries(lib_geometries)
-    loadLibControllers(lib_controllers)
-    loadLibAnimations(lib_animations)
-    
-    prettify(collada)
-    tree = ET.ElementTree(collada)
-    tree.write(filepath, encoding="utf-8", xml_declaration=True)
+                    writer.end()
+        finally:
+            if(sidecar != None):
+                sidecar.close()
+        return keysRemoved, geometrySizes
+
+# Exports the scene with a session of its own, released again afterwards.
+def export( context, filepath, exportSettings=None ):
+    session = ExportSession(exportSettings)
+    try:
+        return session.export(filepath)
+    finally:
+        session.release()
     
 #### comment this test output part when deploying. ####
 #export(bpy.context, r'D://projects//dae_library//assets//dae_dev_mesh.dae')
@@ -0,0 +1,313 @@
+import os
+import xml.etree.ElementTree as ET
+import numpy
+
+from .quantize import decodeAttribute, profile as quantizedProfile
+from .sidecar import SidecarReader, profile as sidecarProfile
+
+# Reads the files the exporter writes back into NumPy arrays, without bpy.
+# The document is streamed with iterparse and every element is dropped as
+# soon as it has been turned into arrays, so memory follows the size of the
+# arrays rather than that of the XML tree. Arrays in the binary sidecar are
+# copied out of its mapping, and quantized sources keep their integers;
+# DAESource.floats() decodes them.
+#
+#   doc = readDocument('hero.dae')
+#   positions = doc.sources[doc.geometries['Body'].inputs['POSITION']].floats()
+
+class DAESource:
+    def __init__(self, id):
+        self.id = id
+        # count / stride x stride values: float32, int64 (or the sidecar
+        # type) or str for Name_array
+        self.data = None
+        self.stride = 1
+        self.params = []
+        # attributes of the QUANTIZED decode element, None when plain
+        self.decode = None
+
+    def floats(self):
+        if(self.decode != None):
+            return decodeAttribute(self.data, self.stride, self.decode)
+        return self.data
+
+class DAEGeometry:
+    def __init__(self, id):
+        self.id = id
+        # semantic -> source id of the <vertices> inputs
+        self.inputs = {}
+        # T x 3 vertex indices of the <triangles>
+        self.indices = None
+
+class DAEController:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.skin = None
+        self.bindShapeMatrix = None
+        # semantic -> (source id, offset) of the <vertex_weights> inputs
+        self.inputs = {}
+        self.vcount = None
+        # N x 2 (joint, weight) index pairs
+        self.v = None
+
+# matrices maps the sid of every <matrix> ('' without one) to its 4 x 4
+# values, in the row major order COLLADA writes them. lods lists the
+# (level, ratio, instances) of the LOD technique.
+class DAENode:
+    def __init__(self, id, sid, type, parent):
+        self.id = id
+        self.sid = sid
+        self.type = type
+        self.parent = parent
+        self.matrices = {}
+        # (tag, url) of every instance_geometry / instance_controller
+        self.instances = []
+        self.lods = []
+
+class DAEAnimation:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        # sampler id -> semantic -> source id
+        self.samplers = {}
+        # (sampler id, target)
+        self.channels = []
+
+class DAEDocument:
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}
+        self.geometries = {}
+        self.controllers = {}
+        self.nodes = {}
+        self.animations = {}
+        # clip id -> (name, start, end, animation ids)
+        self.clips = {}
+
+def localName(tag):
+    return tag.rpartition('}')[2]
+
+def url(text):
+    return text[1:] if text.startswith('#') else text
+
+def parseArray(tag, text):
+    text = text or ''
+    if(tag == 'float_array'):
+        return numpy.fromstring(text, dtype=numpy.float32, sep=' ')
+    if(tag == 'int_array'):
+        return numpy.fromstring(text, dtype=numpy.int64, sep=' ')
+    return numpy.array(text.split(), dtype=str)
+
+class StreamReader:
+    def __init__(self, path):
+        self.doc = DAEDocument(path)
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.sidecars = {}
+        self.source = None
+        self.geometry = None
+        self.controller = None
+        self.animation = None
+        self.sampler = None
+        self.clip = None
+        self.nodes = []
+        self.lod = None
+        self.technique = None
+        # element payloads waiting for their parent: array text, <p>, <v> ...
+        self.arrays = {}
+        self.binaries = {}
+
+    def sidecarView(self, attrib):
+        path = os.path.join(self.directory, attrib['url'])
+        reader = self.sidecars.get(path)
+        if(reader == None):
+            reader = self.sidecars[path] = SidecarReader(path)
+        return numpy.array(reader.view(int(attrib['offset']), int(attrib['count']), attrib['type']))
+
+    def close(self):
+        for reader in self.sidecars.values():
+            reader.close()
+        self.sidecars = {}
+
+    # Text of an integer list element, or its sidecar copy.
+    def intList(self, tag):
+        if(tag in self.binaries):
+            return self.binaries.pop(tag).astype(numpy.int64)
+        return numpy.fromstring(self.arrays.pop(tag, ''), dtype=numpy.int64, sep=' ')
+
+    def start(self, tag, attrib, parent):
+        if(tag == 'source'):
+            self.source = DAESource(attrib['id'])
+        elif(tag == 'accessor' and self.source != None):
+            self.source.stride = int(attrib.get('stride', 1))
+        elif(tag == 'geometry'):
+            self.geometry = self.doc.geometries[attrib['id']] = DAEGeometry(attrib['id'])
+        elif(tag == 'controller'):
+            self.controller = self.doc.controllers[attrib['id']] = DAEController(attrib['id'], attrib.get('name'))
+        elif(tag == 'skin' and self.controller != None):
+            self.controller.skin = url(attrib['source'])
+        elif(tag == 'node'):
+            parent = self.nodes[-1].id if len(self.nodes) != 0 else None
+            node = DAENode(attrib.get('id'), attrib.get('sid'), attrib.get('type'), parent)
+            self.nodes.append(node)
+            self.doc.nodes[node.id] = node
+        elif(tag == 'lod' and len(self.nodes) != 0):
+            self.lod = (int(attrib['level']), float(attrib['ratio']), [])
+            self.nodes[-1].lods.append(self.lod)
+        elif(tag == 'animation'):
+            self.animation = self.doc.animations[attrib['id']] = DAEAnimation(attrib['id'], attrib.get('name'))
+        elif(tag == 'sampler' and self.animation != None):
+            self.sampler = self.animation.samplers[attrib['id']] = {}
+        elif(tag == 'animation_clip'):
+            self.clip = (attrib.get('name'), float(attrib.get('start', 0.0)), float(attrib.get('end', 0.0)), [])
+            self.doc.clips[attrib['id']] = self.clip
+        elif(tag == 'technique'):
+            self.technique = attrib.get('profile')
+
+    def end(self, tag, elem, parent):
+        attrib = elem.attrib
+        if(tag in ('float_array', 'int_array', 'Name_array')):
+            self.arrays['array'] = (tag, elem.text)
+        elif(tag == 'param' and self.source != None and parent == 'accessor'):
+            self.source.params.append(attrib.get('name'))
+        elif(tag == 'binary' and self.technique == sidecarProfile):
+            if('target' in attrib):
+                self.binaries[attrib['target']] = self.sidecarView(attrib)
+            else:
+                self.binaries['array'] = self.sidecarView(attrib)
+        elif(tag == 'decode' and self.source != None and self.technique == quantizedProfile):
+            self.source.decode = dict(attrib)
+        elif(tag == 'source'):
+            source = self.source
+            arrayTag, text = self.arrays.pop('array', ('float_array', None))
+            if('array' in self.binaries):
+                data = self.binaries.pop('array')
+            else:
+                data = parseArray(arrayTag, text)
+            source.data = data.reshape(-1, source.stride) if source.stride > 1 else data
+            self.doc.sources[source.id] = source
+            self.source = None
+        elif(tag in ('p', 'vcount', 'v')):
+            self.arrays[tag] = elem.text or ''
+        elif(tag == 'input'):
+            if(parent == 'vertices' and self.geometry != None):
+                self.geometry.inputs[attrib['semantic']] = url(attrib['source'])
+            elif(parent == 'vertex_weights' and self.controller != None):
+                self.controller.inputs[attrib['semantic']] = (url(attrib['source']), int(attrib.get('offset', 0)))
+            elif(parent == 'sampler' and self.sampler != None):
+                self.sampler[attrib['semantic']] = url(attrib['source'])
+        elif(tag == 'triangles' and self.geometry != None):
+            self.geometry.indices = self.intList('p').reshape(-1, 3)
+        elif(tag == 'vertex_weights' and self.controller != None):
+            self.controller.vcount = self.intList('vcount')
+            self.controller.v = self.intList('v').reshape(-1, 2)
+        elif(tag == 'bind_shape_matrix' and self.controller != None):
+            self.controller.bindShapeMatrix = numpy.fromstring(elem.text or '', dtype=numpy.float32, sep=' ').reshape(4, 4)
+        elif(tag == 'matrix' and len(self.nodes) != 0):
+            self.nodes[-1].matrices[attrib.get('sid', '')] = numpy.fromstring(elem.text or '', dtype=numpy.float32, sep=' ').reshape(4, 4)
+        elif(tag in ('instance_geometry', 'instance_controller')):
+            if(parent == 'lod' and self.lod != None):
+                self.lod[2].append((tag, url(attrib['url'])))
+            elif(parent == 'node' and len(self.nodes) != 0):
+                self.nodes[-1].instances.append((tag, url(attrib['url'])))
+        elif(tag == 'instance_animation' and self.clip != None):
+            self.clip[3].append(url(attrib['url']))
+        elif(tag == 'channel' and self.animation != None):
+            self.animation.channels.append((url(attrib['source']), attrib['target']))
+        elif(tag == 'technique'):
+            self.technique = None
+        elif(tag == 'node'):
+            self.nodes.pop()
+        elif(tag == 'lod'):
+            self.lod = None
+        elif(tag == 'sampler'):
+            self.sampler = None
+        elif(tag == 'animation'):
+            self.animation = None
+        elif(tag == 'animation_clip'):
+            self.clip = None
+        elif(tag == 'geometry'):
+            self.geometry = None
+        elif(tag == 'controller'):
+            self.controller = None
+
+    def read(self, path):
+        stack = []
+        try:
+            for event, elem in ET.iterparse(path, events=('start', 'end')):
+                tag = localName(elem.tag)
+                if(event == 'start'):
+                    self.start(tag, elem.attrib, stack[-1][0] if len(stack) != 0 else None)
+                    stack.append((tag, elem))
+                else:
+                    stack.pop()
+                    parent = stack[-1] if len(stack) != 0 else None
+                    self.end(tag, elem, parent[0] if parent != None else None)
+                    # Handled: drop it, text and all, so the tree never grows.
+                    elem.clear()
+                    if(parent != None):
+                        parent[1].remove(elem)
+        finally:
+            self.close()
+        return self.doc
+
+def readDocument(path):
+    return StreamReader(path).read(path)
+
+# Cross checks of a read document: every reference resolves, indices are
+# in range and array sizes agree. Returns a list of problems, empty when
+# the document is consistent.
+def checkDocument(doc):
+    problems = []
+    def sourceLength(id, where):
+        if(id not in doc.sources):
+            problems.append('{}: missing source {}'.format(where, id))
+            return None
+        return len(doc.sources[id].data)
+
+    for g in doc.geometries.values():
+        lengths = set()
+        for semantic, id in g.inputs.items():
+            length = sourceLength(id, g.id)
+            if(length != None):
+                lengths.add(length)
+        if(len(lengths) > 1):
+            problems.append('{}: vertex sources differ in length {}'.format(g.id, sorted(lengths)))
+        if(g.indices is not None and len(g.indices) != 0 and len(lengths) != 0 and g.indices.max() >= min(lengths)):
+            problems.append('{}: triangle index {} out of range'.format(g.id, int(g.indices.max())))
+
+    for c in doc.controllers.values():
+        if(c.skin not in doc.geometries):
+            problems.append('{}: missing skin geometry {}'.format(c.id, c.skin))
+        else:
+            g = doc.geometries[c.skin]
+            if('POSITION' in g.inputs and g.inputs['POSITION'] in doc.sources and len(c.vcount) != len(doc.sources[g.inputs['POSITION']].data)):
+                problems.append('{}: {} vertex weights for {} vertices'.format(c.id, len(c.vcount), len(doc.sources[g.inputs['POSITION']].data)))
+        if(int(c.vcount.sum()) != len(c.v)):
+            problems.append('{}: vcount adds up to {}, v has {} pairs'.format(c.id, int(c.vcount.sum()), len(c.v)))
+        for semantic, (id, offset) in c.inputs.items():
+            length = sourceLength(id, c.id)
+            if(length != None and len(c.v) != 0 and c.v[:, offset].max() >= length):
+                problems.append('{}: {} index out of range'.format(c.id, semantic))
+
+    for a in doc.animations.values():
+        for samplerId, inputs in a.samplers.items():
+            lengths = {}
+            for semantic in ('INPUT', 'OUTPUT', 'INTERPOLATION'):
+                if(semantic in inputs):
+                    lengths[semantic] = sourceLength(inputs[semantic], samplerId)
+            if(lengths.get('INPUT') != None and lengths.get('INTERPOLATION') != None and lengths['INPUT'] != lengths['INTERPOLATION']):
+                problems.append('{}: {} keys, {} interpolations'.format(samplerId, lengths['INPUT'], lengths['INTERPOLATION']))
+        for samplerId, target in a.channels:
+            if(samplerId not in a.samplers):
+                problems.append('{}: channel of missing sampler {}'.format(a.id, samplerId))
+
+    for n in doc.nodes.values():
+        for tag, id in n.instances + [ i for level, ratio, instances in n.lods for i in instances ]:
+            if(id not in (doc.geometries if tag == 'instance_geometry' else doc.controllers)):
+                problems.append('{}: {} of missing {}'.format(n.id, tag, id))
+    for id, (name, start, end, animations) in doc.clips.items():
+        for a in animations:
+            if(a not in doc.animations):
+                problems.append('{}: missing animation {}'.format(id, a))
+    return problems
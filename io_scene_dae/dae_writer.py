@@ -0,0 +1,228 @@
+import io
+from enum import Enum
+from .numeric_text import encodeFloats, encodeInts
+from .quantize import quantizeRange, decodeTechnique
+from .sidecar import profile
+
+class SourceType(Enum):
+    Name_array = 0
+    float_array = 1
+    int_array = 2
+
+class DataType(Enum):
+    string = 0
+    float = 1
+    float4x4 = 2
+    int = 3
+
+class Param:
+    name = ''
+    type = DataType.string
+    def __init__(self, n, t):
+        self.name = n
+        self.type = t
+
+def escapeText(text):
+    if('&' in text):
+        text = text.replace('&', '&amp;')
+    if('<' in text):
+        text = text.replace('<', '&lt;')
+    if('>' in text):
+        text = text.replace('>', '&gt;')
+    return text
+
+def escapeAttrib(text):
+    text = escapeText(text)
+    if('"' in text):
+        text = text.replace('"', '&quot;')
+    if('\n' in text):
+        text = text.replace('\n', '&#10;')
+    return text
+
+# Writes the document straight to a text stream while it is being built, so
+# nothing but the currently open element chain is kept in memory.
+# Attributes are given as a list of (name, value) pairs to keep their order.
+# Element text may be a string or an iterable of string chunks, which lets
+# big float_array and <p> payloads be produced piece by piece.
+# indent=None writes the document without any whitespace.
+# With a sidecar set, big arrays go to it instead of into the text.
+# written counts the characters written so far.
+class DAEWriter:
+    def __init__(self, stream, indent='\t', depth=0, sidecar=None):
+        self.stream = stream
+        self.indent = indent
+        self.depth = depth
+        self.sidecar = sidecar
+        self.written = 0
+        self.tags = []
+        self.pending = False
+        self.hasChildren = []
+
+    def write(self, text):
+        self.written += len(text)
+        self.stream.write(text)
+
+    def declaration(self):
+        self.write("<?xml version='1.0' encoding='utf-8'?>\n")
+
+    def newline(self):
+        if(self.indent != None):
+            self.write('\n' + self.indent * self.depth)
+
+    def closePending(self):
+        if(self.pending):
+            self.write('>')
+            self.pending = False
+        if(len(self.hasChildren) != 0):
+            self.hasChildren[-1] = True
+
+    def openTag(self, tag, attrib):
+        self.closePending()
+        if(self.depth != 0):
+            self.newline()
+        self.write('<' + tag)
+        if(attrib != None):
+            for name, value in attrib:
+                self.write(' ' + name + '="' + escapeAttrib(value) + '"')
+
+    def start(self, tag, attrib=None):
+        self.openTag(tag, attrib)
+        self.pending = True
+        self.tags.append(tag)
+        self.hasChildren.append(False)
+        self.depth += 1
+
+    def end(self):
+        tag = self.tags.pop()
+        hasChildren = self.hasChildren.pop()
+        self.depth -= 1
+        if(self.pending):
+            self.write(' />')
+            self.pending = False
+            return
+        if(hasChildren):
+            self.newline()
+        self.write('</' + tag + '>')
+
+    def element(self, tag, attrib=None, text=None):
+        self.openTag(tag, attrib)
+        if(text == None):
+            self.write(' />')
+            return
+        if(isinstance(text, str)):
+            text = (text,)
+        opened = False
+        for chunk in text:
+            if(len(chunk) == 0):
+                continue
+            if(not opened):
+                self.write('>')
+                opened = True
+            self.write(escapeText(chunk))
+        if(opened):
+            self.write('</' + tag + '>')
+        else:
+            self.write(' />')
+
+    # Inserts an already serialized fragment as the next child.
+    def raw(self, fragment):
+        self.closePending()
+        self.write(fragment)
+
+# Runs write(writer, *args) against an in-memory writer that continues at
+# the depth of the given one, and returns the text for writer.raw().
+def renderFragment(writer, write, *args):
+    buf = io.StringIO()
+    write(DAEWriter(buf, writer.indent, writer.depth), *args)
+    return buf.getvalue()
+
+# Formats values a slice at a time and yields the space separated text in
+# chunks, so a payload never exists as one big string.
+def chunkedJoin(values, fmt, chunkSize=4096):
+    for i in range(0, len(values), chunkSize):
+        text = ' '.join( fmt.format(v) for v in values[i:i + chunkSize] )
+        yield text if i == 0 else ' ' + text
+
+def addInputBlock(writer, semantic, source, offset=None):
+    attrib = [('semantic', semantic), ('source', source)]
+    if(offset != None):
+        attrib.append(('offset', str(offset)))
+    writer.element('input', attrib)
+
+# binary, a sidecar BinaryRef, replaces strdata: the array element is left
+# empty and a technique of the sidecar profile says where the values are.
+# techniques are further (profile, tag, attrib) techniques of the source.
+def buildSource(writer, strdata, count, id, params, sourceType=SourceType.float_array, binary=None, techniques=()):
+    writer.start('source', [('id', id)])
+    writer.element(sourceType.name, [('id', id + '.data'), ('count', str(count))], strdata)
+
+    writer.start('technique_common')
+    accessorAttrib = [('source', '#' + id + '.data')]
+    stride = 0
+    for p in params:
+        t = p.type
+        if( t == DataType.string or t == DataType.float or t == DataType.int):
+            stride += 1
+        elif ( t == DataType.float4x4 ):
+            stride += 16
+    if(stride != 0):
+        accessorAttrib.append(('count', str(int(count/stride))))
+        accessorAttrib.append(('stride', str(stride)))
+    writer.start('accessor', accessorAttrib)
+    for p in params:
+        writer.element('param', [('name', p.name), ('type', p.type.name)])
+    writer.end()
+    writer.end()
+    if(binary != None):
+        writer.start('technique', [('profile', profile)])
+        writer.element('binary', binary.attrib())
+        writer.end()
+    for techniqueProfile, tag, attrib in techniques:
+        writer.start('technique', [('profile', techniqueProfile)])
+        writer.element(tag, attrib)
+        writer.end()
+    writer.end()
+
+# A float_array source, in the sidecar when the writer has one and the array
+# is big enough, as text otherwise.
+def buildFloatSource(writer, values, id, params, precision, trimZeros):
+    count = values.size
+    if(writer.sidecar != None and writer.sidecar.wants(values)):
+        buildSource(writer, None, count, id, params, SourceType.float_array, writer.sidecar.append(values, 'float32'))
+    else:
+        buildSource(writer, encodeFloats(values, precision, trimZeros), count, id, params, SourceType.float_array)
+
+# An int_array source; type is the sidecar type the values are stored as.
+def buildIntSource(writer, values, id, params, type='int32', techniques=()):
+    count = values.size
+    if(writer.sidecar != None and writer.sidecar.wants(values)):
+        buildSource(writer, None, count, id, params, SourceType.int_array, writer.sidecar.append(values, type), techniques)
+    else:
+        buildSource(writer, encodeInts(values), count, id, params, SourceType.int_array, None, techniques)
+
+# values (N x len(names)) quantized to 16 bits over their range, decoded
+# by the RANGE technique of the source.
+def buildRangeSource(writer, values, id, names, signed=False):
+    q, offset, scale = quantizeRange(values, signed)
+    buildIntSource(writer, q, id, [ Param(n, DataType.int) for n in names ], 'int16' if signed else 'uint16', [decodeTechnique('RANGE', offset, scale)])
+
+# An integer list element such as <p>, <vcount> or <v>. Returns the
+# BinaryRef when the values went to the sidecar; pass the refs of an element
+# to writeBinaryExtra once its other children are written.
+def writeIntList(writer, tag, values):
+    if(writer.sidecar != None and writer.sidecar.wants(values)):
+        writer.element(tag)
+        return (tag, writer.sidecar.append(values, 'int32'))
+    writer.element(tag, None, encodeInts(values))
+    return None
+
+def writeBinaryExtra(writer, refs):
+    refs = [ r for r in refs if r != None ]
+    if(len(refs) == 0):
+        return
+    writer.start('extra')
+    writer.start('technique', [('profile', profile)])
+    for tag, ref in refs:
+        writer.element('binary', [('target', tag)] + ref.attrib())
+    writer.end()
+    writer.end()
@@ -0,0 +1,95 @@
+import bpy
+import os
+
+from . import collada_exporter
+from .settings import ExportSettings
+
+class DAEExporter(bpy.types.Operator):
+    """My Object Moving Script"""      # blender will use this as a tooltip for menu items and buttons.
+    bl_idname = 'dae.exporter'        # unique identifier for buttons and menu items to reference.
+    bl_label = 'Collada Exporte'    # display name in the interface.
+    bl_options = {'PRESET'}  # enable undo for the operator.
+    
+    filepath = bpy.props.StringProperty(subtype="FILE_PATH")
+    indent = bpy.props.BoolProperty(name="Indent", description="Indent the written XML", default=True)
+    precision = bpy.props.IntProperty(name="Precision", description="Decimal digits of positions, normals, matrices and weights", default=4, min=0, max=9)
+    uvPrecision = bpy.props.IntProperty(name="UV Precision", description="Decimal digits of texture coordinates", default=4, min=0, max=9)
+    trimZeros = bpy.props.BoolProperty(name="Trim Zeros", description="Drop trailing zeros of written numbers", default=True)
+    normals = bpy.props.EnumProperty(name="Normals", description="Normals written for every vertex",
+        items=[('SPLIT', "Split", "Per corner normals, following smooth shading and custom normals"), ('FLAT', "Flat", "One normal per face; every face gets its own vertices, which makes smooth meshes much larger")], default='SPLIT')
+    instanceGeometry = bpy.props.BoolProperty(name="Instance Geometry", description="Write meshes with identical contents once, whatever they are named", default=True)
+    lodRatios = bpy.props.StringProperty(name="LOD Ratios", description="Comma separated triangle ratios of the reduced detail geometries written for every mesh, e.g. 0.5, 0.25", default="")
+    optimizeVertexCache = bpy.props.BoolProperty(name="Optimize Vertex Cache", description="Reorder triangles and vertices for the GPU's post-transform vertex cache", default=False)
+    vertexCacheSize = bpy.props.IntProperty(name="Vertex Cache Size", description="Vertices the optimized cache holds", default=16, min=3, max=64)
+    maxInfluences = bpy.props.IntProperty(name="Max Influences", description="Keep only the heaviest bone influences of every vertex, 0 keeps all", default=0, min=0, max=16)
+    minWeight = bpy.props.FloatProperty(name="Min Weight", description="Drop bone influences lighter than this", default=0.0, min=0.0, max=1.0)
+    normalizeWeights = bpy.props.BoolProperty(name="Normalize Weights", description="Rescale the kept influences of every vertex to sum to one", default=False)
+    reduceKeys = bpy.props.BoolProperty(name="Reduce Keys", description="Remove animation keys that interpolating their neighbours reproduces", default=False)
+    keyPositionError = bpy.props.FloatProperty(name="Position Error", description="Largest translation error a removed key may introduce", default=0.001, min=0.0)
+    keyRotationError = bpy.props.FloatProperty(name="Rotation Error", description="Largest rotation error in degrees a removed key may introduce", default=0.1, min=0.0)
+    keyScaleError = bpy.props.FloatProperty(name="Scale Error", description="Largest scale error a removed key may introduce", default=0.001, min=0.0)
+    vertexDeltaThreshold = bpy.props.FloatProperty(name="Vertex Delta Threshold", description="Leave vertices moving less than this out of mesh and shape key animation", default=0.0001, min=0.0)
+    quantizeVertexDeltas = bpy.props.BoolProperty(name="Quantize Vertex Deltas", description="Write vertex animation deltas as 16 bit integers over each clip's range", default=False)
+    quantizeAttributes = bpy.props.BoolProperty(name="Quantize Attributes", description="Write positions, normals, uvs and skin weights as small integers with decode parameters", default=False)
+    binarySidecar = bpy.props.BoolProperty(name="Binary Sidecar", description="Write large arrays to a .bin file next to the .dae", default=False)
+    binaryThreshold = bpy.props.IntProperty(name="Binary Threshold", description="Smallest number of values written to the sidecar", default=256, min=1)
+    useCache = bpy.props.BoolProperty(name="Incremental", description="Reuse geometries and controllers of unchanged meshes from the export cache", default=False)
+    cacheSize = bpy.props.IntProperty(name="Cache Size (MB)", description="Size the export cache is trimmed back to after every export", default=512, min=1)
+    workers = bpy.props.IntProperty(name="Workers", description="Processes geometries and controllers are written on, 1 writes them in Blender itself", default=1, min=1, max=64)
+    profile = bpy.props.BoolProperty(name="Profile", description="Time every export stage and object and write a .profile.json report next to the file", default=False)
+    profileMemory = bpy.props.BoolProperty(name="Profile Memory", description="Trace allocations for the peak memory of every stage; slows the export down, so its times are not representative", default=False)
+    
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def execute(self, context):        # execute() is called by blender when running the operator.
+        settings = ExportSettings()
+        settings.indent = '\t' if self.indent else None
+        settings.precision = self.precision
+        settings.uvPrecision = self.uvPrecision
+        settings.trimZeros = self.trimZeros
+        settings.normals = self.normals
+        settings.instanceGeometry = self.instanceGeometry
+        try:
+            settings.lodRatios = tuple( float(r) for r in self.lodRatios.replace(',', ' ').split() )
+        except ValueError:
+            self.report({'ERROR'}, 'LOD ratios must be numbers: ' + self.lodRatios)
+            return {'CANCELLED'}
+        settings.optimizeVertexCache = self.optimizeVertexCache
+        settings.vertexCacheSize = self.vertexCacheSize
+        settings.maxInfluences = self.maxInfluences
+        settings.minWeight = self.minWeight
+        settings.normalizeWeights = self.normalizeWeights
+        settings.reduceKeys = self.reduceKeys
+        settings.keyPositionError = self.keyPositionError
+        settings.keyRotationError = self.keyRotationError
+        settings.keyScaleError = self.keyScaleError
+        settings.vertexDeltaThreshold = self.vertexDeltaThreshold
+        settings.quantizeVertexDeltas = self.quantizeVertexDeltas
+        settings.quantizeAttributes = self.quantizeAttributes
+        settings.binarySidecar = self.binarySidecar
+        settings.binaryThreshold = self.binaryThreshold
+        if(self.useCache):
+            settings.cacheDirectory = os.path.join(os.path.dirname(os.path.abspath(self.filepath)), '.dae_cache')
+            settings.cacheSize = self.cacheSize * 1024 * 1024
+        settings.workers = self.workers
+        settings.profile = self.profile
+        settings.profileMemory = self.profileMemory
+        stats = collada_exporter.export(context, self.filepath, settings)
+        if('cacheHits' in stats):
+            self.report({'INFO'}, 'Export cache: {} hits, {} misses, {} evicted'.format(stats['cacheHits'], stats['cacheMisses'], stats['cacheEvicted']))
+        if(stats.get('instancedMeshes', 0) != 0):
+            self.report({'INFO'}, 'Instancing: {} meshes share geometry, {} bytes saved'.format(stats['instancedMeshes'], stats['bytesSaved']))
+        for g, triangles in sorted(stats.get('lodTriangles', {}).items()):
+            self.report({'INFO'}, 'LODs {}: {} triangles'.format(g, ' -> '.join( str(t) for t in triangles )))
+        for g, ratios in sorted(stats.get('vertexCache', {}).items()):
+            self.report({'INFO'}, 'Vertex cache {}: ACMR {:.3f} -> {:.3f}'.format(g, ratios[0], ratios[1]))
+        if('keysRemoved' in stats):
+            self.report({'INFO'}, 'Key reduction removed {} keys'.format(stats['keysRemoved']))
+        if('profile' in stats):
+            self.report({'INFO'}, stats['profileSummary'] + ', report: ' + stats['profile'])
+        return {'FINISHED'}            # this lets blender know the operator finished successfully.
+
+def menu_func(self, context):
+    self.layout.operator(DAEExporter.bl_idname, text="Collada (.dae)")
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import threading
+import numpy
+
+# Bump whenever the text written for a geometry or controller changes, so
+# fragments written by an older exporter are never reused.
+formatVersion = 2
+
+# sha1 of the given arrays, bytes and plain values, in order.
+def contentHash(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        if(isinstance(p, numpy.ndarray)):
+            p = numpy.ascontiguousarray(p)
+            h.update((p.dtype.str + str(p.shape)).encode('utf-8'))
+            # a flat byte view, which empty arrays of any shape have too
+            h.update(p.reshape(-1).view(numpy.uint8))
+        elif(isinstance(p, bytes)):
+            h.update(p)
+        else:
+            h.update(repr(p).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+# Finished <geometry>/<controller> fragments stored on disk under the hash
+# of everything that went into them, optionally with arrays the exporter
+# needs back on a hit (an .npz under the same key). Entries are plain
+# files; their mtime is refreshed on every hit and the least recently used
+# ones are removed once the directory grows past maxBytes.
+class FragmentCache:
+    def __init__(self, directory, maxBytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *parts):
+        return contentHash(formatVersion, *parts)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.frag')
+
+    def arraysPath(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    # The fragment stored under key, or None. withArrays returns it as
+    # (fragment, arrays) with the arrays stored by putArrays, and an entry
+    # missing either half is a miss.
+    def get(self, key, withArrays=False):
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                fragment = f.read()
+            if(withArrays):
+                with numpy.load(self.arraysPath(key)) as data:
+                    arrays = { name: data[name] for name in data.files }
+                os.utime(self.arraysPath(key), None)
+            os.utime(path, None)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (fragment, arrays) if withArrays else fragment
+
+    # unique per process and thread, as several exports may share the cache
+    def tempPath(self, path):
+        return '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+    def put(self, key, fragment):
+        path = self.path(key)
+        tmp = self.tempPath(path)
+        with open(tmp, 'w', encoding='utf-8', newline='') as f:
+            f.write(fragment)
+        os.replace(tmp, path)
+
+    def putArrays(self, key, arrays):
+        path = self.arraysPath(key)
+        tmp = self.tempPath(path)
+        with open(tmp, 'wb') as f:
+            numpy.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if(not name.endswith('.frag') and not name.endswith('.npz')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        removed = 0
+        for mtime, size, path in entries:
+            if(total <= self.maxBytes):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
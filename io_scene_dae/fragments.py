@@ -0,0 +1,101 @@
+import io
+from .dae_writer import DAEWriter, SourceType, DataType, Param, addInputBlock, buildSource, buildFloatSource, buildIntSource, buildRangeSource, writeIntList, writeBinaryExtra
+from .mesh_arrays import buildSkinWeights, expandInfluences
+from .numeric_text import floatsToText
+from .quantize import decodeTechnique, octEncode, octScale, weightScale
+
+# Everything in here works on data already pulled out of Blender, so it can
+# run in the export worker processes as well as in the exporter itself.
+
+# sourceVertices maps the vertices of the skinned geometry back to the
+# blender vertices the influences are stored on.
+class ControllerData:
+    def __init__(self, name, meshName, bindShapeMatrix, skin, sourceVertices):
+        self.name = name
+        self.meshName = meshName
+        self.bindShapeMatrix = bindShapeMatrix
+        self.skin = skin
+        self.sourceVertices = sourceVertices
+
+    def hashParts(self):
+        return [self.name, self.meshName, self.bindShapeMatrix, self.sourceVertices] + self.skin.hashParts()
+
+    def counts(self):
+        return self.skin.counts()
+
+def writeController( writer, c, ctrl, settings ):
+    skin = ctrl.skin
+    sourceName_0 = c + '.groups'
+    bonesNameList = ' '.join( n for n in skin.groupNames)
+    sourceName_2 = c + '.skin.weights'
+    vcount, v, weights = buildSkinWeights(skin.vcount, skin.groups, skin.weights,
+        settings.maxInfluences, settings.minWeight, settings.normalizeWeights, settings.quantizeAttributes)
+    vcount, v = expandInfluences(vcount, v, ctrl.sourceVertices)
+        
+    writer.start('controller', [('id', c), ('name', ctrl.name)])
+    writer.start('skin', [('source', '#' + ctrl.meshName)])
+    
+    writer.element('bind_shape_matrix', None, floatsToText(ctrl.bindShapeMatrix.T, settings.precision, settings.trimZeros))
+    
+    buildSource(writer, bonesNameList, len(skin.groupNames), sourceName_0, [ Param('GROUPS',DataType.string) ], SourceType.Name_array)
+    if(settings.quantizeAttributes):
+        buildIntSource(writer, weights, sourceName_2, [Param('WEIGHT',DataType.int)], 'uint8', [decodeTechnique('RANGE', [0.0], [weightScale])])
+    else:
+        buildFloatSource(writer, weights, sourceName_2, [Param('WEIGHT',DataType.float)], settings.precision, settings.trimZeros)
+             
+    writer.start('vertex_weights', [('count', str(len(vcount)))])
+    addInputBlock(writer, 'GROUPS', '#' + sourceName_0, 0)
+    addInputBlock(writer, 'WEIGHT', '#' + sourceName_2, 1)
+    
+    refs = [ writeIntList(writer, 'vcount', vcount), writeIntList(writer, 'v', v) ]
+    writeBinaryExtra(writer, refs)
+    writer.end()
+    writer.end()
+    writer.end()
+
+def writeGeometry( writer, g, buffers, settings ):
+    sourceNamePos = g + '.vertex.position'
+    sourceNameNormal = g + '.vertex.normal'
+    uvNames = [ g + '.uvlayer' + str(i) for i in range(len(buffers.uvLayers)) ]
+
+    writer.start('geometry', [('id', g)])
+    writer.start('mesh')
+    # Quantized, positions and uvs are 16 bit over the geometry's bounding
+    # box and normals octahedral (see quantize.py).
+    if(settings.quantizeAttributes):
+        buildRangeSource(writer, buffers.positions, sourceNamePos, ['x', 'y', 'z'])
+        buildIntSource(writer, octEncode(buffers.normals), sourceNameNormal,
+            [ Param('u',DataType.int), Param('v',DataType.int) ], 'int16', [decodeTechnique('OCTAHEDRAL', None, [octScale])])
+        for i in range(len(buffers.uvLayers)):
+            buildRangeSource(writer, buffers.uvLayers[i], uvNames[i], ['u', 'v'])
+    else:
+        buildFloatSource(writer, buffers.positions, sourceNamePos,
+            [ Param('x',DataType.float), Param('y',DataType.float), Param('z',DataType.float) ], settings.precision, settings.trimZeros)
+        buildFloatSource(writer, buffers.normals, sourceNameNormal,
+            [ Param('x',DataType.float), Param('y',DataType.float), Param('z',DataType.float) ], settings.precision, settings.trimZeros)
+        for i in range(len(buffers.uvLayers)):
+            buildFloatSource(writer, buffers.uvLayers[i], uvNames[i],
+                [ Param('u',DataType.float), Param('v',DataType.float)], settings.uvPrecision, settings.trimZeros)
+    
+    # Every attribute is per vertex, so the triangles need a single index.
+    verticesDomID = g + '.vertices'
+    writer.start('vertices', [('id', verticesDomID)])
+    addInputBlock(writer, 'POSITION', '#' + sourceNamePos)
+    addInputBlock(writer, 'NORMAL', '#' + sourceNameNormal)
+    for i in range(len(buffers.uvLayers)):
+        addInputBlock(writer, 'TEXCOORD' + str(i), '#' + uvNames[i])
+    writer.end()
+    
+    writer.start('triangles', [('count', str(len(buffers.indices) // 3))])
+    addInputBlock(writer, 'VERTEX', '#' + verticesDomID, 0)
+    writeBinaryExtra(writer, [ writeIntList(writer, 'p', buffers.indices) ])
+    writer.end()
+    writer.end()
+    writer.end()
+
+# Worker entry point: task is (write, id, data, settings, indent, depth).
+def renderTask( task ):
+    write, id, data, settings, indent, depth = task
+    buf = io.StringIO()
+    write(DAEWriter(buf, indent, depth), id, data, settings)
+    return buf.getvalue()
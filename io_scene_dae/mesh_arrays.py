@@ -0,0 +1,241 @@
+import numpy
+
+from .quantize import quantizeWeights
+
+class MeshArrays:
+    def __init__(self):
+        self.positions = None
+        self.loopVertices = None
+        self.loopStart = None
+        self.loopTotal = None
+        self.polygonNormals = None
+        # per loop normals, only extracted for split normals
+        self.loopNormals = None
+        self.uvLayers = []
+
+    def hashParts(self):
+        return [self.positions, self.loopVertices, self.loopStart, self.loopTotal, self.polygonNormals, self.loopNormals] + self.uvLayers
+
+    def counts(self):
+        triangles = int(numpy.maximum(self.loopTotal.astype(numpy.int64) - 2, 0).sum())
+        return [('vertices', len(self.positions)), ('polygons', len(self.loopStart)), ('triangles', triangles)]
+
+class SkinArrays:
+    def __init__(self):
+        self.groupNames = []
+        self.vcount = None
+        self.groups = None
+        self.weights = None
+
+    def hashParts(self):
+        return [self.groupNames, self.vcount, self.groups, self.weights]
+
+    def counts(self):
+        return [('vertices', len(self.vcount)), ('bones', len(self.groupNames)), ('weights', len(self.weights))]
+
+# Unique render vertices of a mesh and the triangles indexing them. Each
+# vertex is one distinct (blender vertex, normal, uvs) combination of the
+# triangle corners; sourceVertices gives the blender vertex it came from.
+class VertexBuffers:
+    def __init__(self):
+        self.positions = None
+        self.normals = None
+        self.uvLayers = []
+        self.indices = None
+        self.sourceVertices = None
+
+    def hashParts(self):
+        return [self.positions, self.normals, self.indices] + self.uvLayers
+
+    def counts(self):
+        return [('vertices', len(self.positions)), ('triangles', len(self.indices) // 3)]
+
+# Pull everything loadLibGeometries needs out of the mesh with foreach_get
+# instead of touching the RNA one element at a time. splitNormals also
+# reads the per loop normals, which honour smooth shading and auto smooth.
+def extractMeshArrays(mesh, splitNormals=False):
+    arrays = MeshArrays()
+    vertices = mesh.vertices
+    loops = mesh.loops
+    polygons = mesh.polygons
+
+    positions = numpy.empty(len(vertices) * 3, dtype=numpy.float32)
+    vertices.foreach_get('co', positions)
+    arrays.positions = positions.reshape(-1, 3)
+
+    loopVertices = numpy.empty(len(loops), dtype=numpy.int32)
+    loops.foreach_get('vertex_index', loopVertices)
+    arrays.loopVertices = loopVertices
+
+    loopStart = numpy.empty(len(polygons), dtype=numpy.int32)
+    polygons.foreach_get('loop_start', loopStart)
+    arrays.loopStart = loopStart
+    loopTotal = numpy.empty(len(polygons), dtype=numpy.int32)
+    polygons.foreach_get('loop_total', loopTotal)
+    arrays.loopTotal = loopTotal
+
+    normals = numpy.empty(len(polygons) * 3, dtype=numpy.float32)
+    polygons.foreach_get('normal', normals)
+    arrays.polygonNormals = normals.reshape(-1, 3)
+
+    if(splitNormals):
+        mesh.calc_normals_split()
+        loopNormals = numpy.empty(len(loops) * 3, dtype=numpy.float32)
+        loops.foreach_get('normal', loopNormals)
+        arrays.loopNormals = loopNormals.reshape(-1, 3)
+        mesh.free_normals_split()
+
+    for uvLayer in mesh.uv_layers:
+        uvs = numpy.empty(len(loops) * 2, dtype=numpy.float32)
+        uvLayer.data.foreach_get('uv', uvs)
+        arrays.uvLayers.append(uvs.reshape(-1, 2))
+    return arrays
+
+# Element counts and positions of a mesh, a few foreach_get calls: meshes
+# that differ in these differ in full too, so only meshes that agree on
+# them need extractMeshArrays to be told apart.
+def meshSummary(mesh):
+    positions = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get('co', positions)
+    return [len(mesh.vertices), len(mesh.loops), len(mesh.polygons), len(mesh.uv_layers), positions]
+
+# Vertex groups have no foreach_get, so this is the one pass over the
+# vertices that cannot be avoided; it only collects the raw influences,
+# everything else happens in buildSkinWeights.
+def extractSkinArrays(obj, mesh):
+    skin = SkinArrays()
+    for vg in obj.vertex_groups:
+        skin.groupNames.append(vg.name)
+
+    vertices = mesh.vertices
+    vcount = numpy.fromiter((len(vert.groups) for vert in vertices), dtype=numpy.int32, count=len(vertices))
+    total = int(vcount.sum())
+    skin.vcount = vcount
+    skin.groups = numpy.fromiter((g.group for vert in vertices for g in vert.groups), dtype=numpy.int32, count=total)
+    skin.weights = numpy.fromiter((g.weight for vert in vertices for g in vert.groups), dtype=numpy.float32, count=total)
+    return skin
+
+# Turns raw per vertex influences into the vcount, v and weights arrays of
+# <vertex_weights>. Influences below minWeight are dropped, then only the
+# maxInfluences heaviest of every vertex are kept (0 keeps all of them) and,
+# with normalize, the survivors are rescaled to sum to one. Kept influences
+# stay in their original order, and the distinct weights are listed in order
+# of first use, so with the defaults the result matches the old dict based
+# dedup. With quantize the weights are 8 bit integers (see quantize.py), so
+# there are at most 256 distinct ones.
+def buildSkinWeights(vcount, groups, weights, maxInfluences=0, minWeight=0.0, normalize=False, quantize=False):
+    vcount = numpy.asarray(vcount, dtype=numpy.int64)
+    groups = numpy.asarray(groups, dtype=numpy.int64)
+    weights = numpy.asarray(weights, dtype=numpy.float32)
+    vertexCount = len(vcount)
+    owners = numpy.repeat(numpy.arange(vertexCount), vcount)
+
+    keep = numpy.ones(len(weights), dtype=bool)
+    if(minWeight > 0.0):
+        keep &= weights >= minWeight
+    if(maxInfluences > 0):
+        candidates = numpy.flatnonzero(keep)
+        order = candidates[numpy.lexsort((-weights[candidates], owners[candidates]))]
+        sortedOwners = owners[order]
+        firstOfOwner = numpy.searchsorted(sortedOwners, sortedOwners, side='left')
+        rank = numpy.arange(len(order)) - firstOfOwner
+        keep[:] = False
+        keep[order[rank < maxInfluences]] = True
+
+    owners = owners[keep]
+    groups = groups[keep]
+    weights = weights[keep]
+    vcount = numpy.bincount(owners, minlength=vertexCount)
+    if(normalize and len(weights) != 0):
+        sums = numpy.bincount(owners, weights.astype(numpy.float64), minlength=vertexCount)
+        sums[sums == 0.0] = 1.0
+        weights = (weights / sums[owners]).astype(numpy.float32)
+    if(quantize):
+        weights = quantizeWeights(weights, owners, vertexCount)
+
+    uniqueWeights, firstUse, inverse = numpy.unique(weights, return_index=True, return_inverse=True)
+    byFirstUse = numpy.argsort(firstUse, kind='mergesort')
+    remap = numpy.empty(len(byFirstUse), dtype=numpy.int64)
+    remap[byFirstUse] = numpy.arange(len(byFirstUse))
+    v = numpy.empty((len(groups), 2), dtype=numpy.int64)
+    v[:, 0] = groups
+    v[:, 1] = remap[inverse.ravel()]
+    return vcount, v.ravel(), uniqueWeights[byFirstUse]
+
+# Fan triangulation of every polygon: (s, s+k, s+k+1) for k in 1..n-2.
+# Quads come out as (0,1,2) (0,2,3), the same split the exporter always used.
+# Returns the loop index of every triangle corner (T x 3) and the polygon
+# each triangle came from.
+def triangulate(loopStart, loopTotal):
+    triCount = numpy.maximum(loopTotal.astype(numpy.int64) - 2, 0)
+    total = int(triCount.sum())
+    triPolygons = numpy.repeat(numpy.arange(len(loopStart)), triCount)
+    firstTri = numpy.cumsum(triCount) - triCount
+    k = numpy.arange(total) - numpy.repeat(firstTri, triCount) + 1
+    s = loopStart.astype(numpy.int64)[triPolygons]
+    corners = numpy.empty((total, 3), dtype=numpy.int64)
+    corners[:, 0] = s
+    corners[:, 1] = s + k
+    corners[:, 2] = s + k + 1
+    return corners, triPolygons
+
+# Loop indices of all polygons, polygon after polygon.
+def polygonLoops(loopStart, loopTotal):
+    loopTotal = loopTotal.astype(numpy.int64)
+    firstOut = numpy.cumsum(loopTotal) - loopTotal
+    return numpy.arange(int(loopTotal.sum())) + numpy.repeat(loopStart.astype(numpy.int64) - firstOut, loopTotal)
+
+# Gathers the influences of every render vertex from the blender vertex it
+# was built from. vcount and v are in the layout buildSkinWeights returns.
+def expandInfluences(vcount, v, sourceVertices):
+    pairs = v.reshape(-1, 2)
+    starts = numpy.cumsum(vcount) - vcount
+    counts = vcount[sourceVertices]
+    firstOut = numpy.cumsum(counts) - counts
+    gather = numpy.arange(int(counts.sum())) - numpy.repeat(firstOut - starts[sourceVertices], counts)
+    return counts, pairs[gather].ravel()
+
+# Rows compared bytewise: the blender vertex index followed by the bits of
+# every float attribute. -0.0 is folded into 0.0 first so it does not split
+# otherwise equal vertices.
+def attributeRows(loopVertices, attributes):
+    width = 1 + sum( a.shape[1] for a in attributes )
+    rows = numpy.empty((len(loopVertices), width), dtype=numpy.uint32)
+    rows[:, 0] = loopVertices
+    column = 1
+    for a in attributes:
+        values = numpy.ascontiguousarray(a, dtype=numpy.float32) + numpy.float32(0.0)
+        rows[:, column:column + a.shape[1]] = values.view(numpy.uint32)
+        column += a.shape[1]
+    return rows.view(numpy.dtype((numpy.void, rows.dtype.itemsize * width))).ravel()
+
+# Builds the indexed vertex buffers: every triangle corner becomes a tuple
+# of position, normal (the polygon's, or the loop's split normal when the
+# arrays have them) and every uv layer, equal tuples are welded into one
+# vertex, and vertices are numbered in the order the triangles first use
+# them. Without weldNormals the tuples leave the normal out, and a vertex
+# keeps the normal of the first corner that uses it.
+def buildVertexBuffers(arrays, weldNormals=True):
+    corners = triangulate(arrays.loopStart, arrays.loopTotal)[0]
+    if(arrays.loopNormals is not None):
+        loopNormals = arrays.loopNormals
+    else:
+        loopNormals = numpy.zeros((len(arrays.loopVertices), 3), dtype=numpy.float32)
+        loopNormals[polygonLoops(arrays.loopStart, arrays.loopTotal)] = numpy.repeat(arrays.polygonNormals, arrays.loopTotal, axis=0)
+    rows = attributeRows(arrays.loopVertices, ([loopNormals] if weldNormals else []) + arrays.uvLayers)
+    uniqueRows, loopKeys = numpy.unique(rows, return_inverse=True)
+
+    cornerKeys = loopKeys.ravel()[corners.ravel()]
+    usedKeys, firstUse = numpy.unique(cornerKeys, return_index=True)
+    byFirstUse = numpy.argsort(firstUse, kind='mergesort')
+    remap = numpy.empty(len(uniqueRows), dtype=numpy.int64)
+    remap[usedKeys[byFirstUse]] = numpy.arange(len(usedKeys))
+    firstLoops = corners.ravel()[firstUse[byFirstUse]]
+
+    buffers = VertexBuffers()
+    buffers.sourceVertices = arrays.loopVertices[firstLoops].astype(numpy.int64)
+    buffers.positions = arrays.positions[buffers.sourceVertices]
+    buffers.normals = loopNormals[firstLoops]
+    buffers.uvLayers = [ uvs[firstLoops] for uvs in arrays.uvLayers ]
+    buffers.indices = remap[cornerKeys]
+    return buffers
@@ -0,0 +1,34 @@
+import re
+import numpy
+
+trailingZeros = re.compile(r'\.?0+(?= |$)')
+negativeZero = re.compile(r'(^| )-0(?= |$)')
+
+# One '%' over a whole chunk is far cheaper than formatting every value on
+# its own, and the regex passes then work on the chunk text in one go.
+def encodeFloats(values, precision=4, trimZeros=True, chunkSize=8192):
+    flat = numpy.asarray(values, dtype=numpy.float64).ravel()
+    valueFormat = '%.' + str(precision) + 'f'
+    chunkFormat = None
+    for i in range(0, len(flat), chunkSize):
+        chunk = flat[i:i + chunkSize]
+        if(chunkFormat == None or len(chunk) != chunkSize):
+            chunkFormat = ' '.join([valueFormat] * len(chunk))
+        text = chunkFormat % tuple(chunk.tolist())
+        if(trimZeros and precision > 0):
+            text = trailingZeros.sub('', text)
+            text = negativeZero.sub(r'\g<1>0', text)
+        yield text if i == 0 else ' ' + text
+
+def encodeInts(values, chunkSize=8192):
+    flat = numpy.asarray(values, dtype=numpy.int64).ravel()
+    chunkFormat = None
+    for i in range(0, len(flat), chunkSize):
+        chunk = flat[i:i + chunkSize]
+        if(chunkFormat == None or len(chunk) != chunkSize):
+            chunkFormat = ' '.join(['%d'] * len(chunk))
+        text = chunkFormat % tuple(chunk.tolist())
+        yield text if i == 0 else ' ' + text
+
+def floatsToText(values, precision=4, trimZeros=True):
+    return ''.join(encodeFloats(values, precision, trimZeros))
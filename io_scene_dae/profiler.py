@@ -0,0 +1,160 @@
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# Per stage and per object timings of one export, with element counts and
+# peak memory. Stages and objects are timed with
+#
+#   with profiler.stage('loadLibGeometries'):
+#       with profiler.item('geometry', id) as record:
+#           record.count('vertices', n)
+#
+# By default peak memory is the peak resident size of the process so far
+# (ru_maxrss) read at the end of every stage; it never goes down, so a
+# stage's own use shows as the growth over the stage before. Reading it
+# costs a system call per stage and timing costs two clock reads per stage
+# and object, so the times are those of an unprofiled export.
+#
+# traceMemory turns on tracemalloc instead, for the peak of every stage's
+# own allocations (NumPy buffers included). Tracing slows every allocation
+# down, pure Python code far more than NumPy code, so the times of such a
+# run are not comparable with each other or with an unprofiled export.
+# Pythons without tracemalloc.reset_peak report the peak since the export
+# started for every stage. tracemalloc is process wide, so traced exports
+# running at the same time see each other's memory.
+class ExportProfiler:
+    def __init__(self, traceMemory=False):
+        self.traceMemory = traceMemory
+        self.stages = []
+        self.objects = []
+        self.started = None
+        self.seconds = 0.0
+        self.peakBytes = 0
+        self.ownsTracing = False
+
+    def start(self):
+        if(self.traceMemory and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+            self.ownsTracing = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.started
+        self.peakBytes = max([self.peakBytes, self.peakMemory()] + [ s['peakBytes'] for s in self.stages ])
+        if(self.ownsTracing):
+            tracemalloc.stop()
+            self.ownsTracing = False
+
+    # Peak traced memory of the current stage, or peak resident size of the
+    # process; 0 where neither is available.
+    def peakMemory(self):
+        if(self.traceMemory):
+            current, peak = tracemalloc.get_traced_memory()
+            return peak
+        if(resource == None):
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes everywhere but on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def resetPeak(self):
+        if(self.traceMemory and hasattr(tracemalloc, 'reset_peak')):
+            tracemalloc.reset_peak()
+
+    def stage(self, name):
+        return StageTimer(self, name)
+
+    def item(self, kind, name):
+        return ItemRecord(self, kind, name)
+
+    def report(self):
+        return {
+            'seconds': self.seconds,
+            'memory': 'tracemalloc' if self.traceMemory else 'maxrss',
+            'peakBytes': self.peakBytes,
+            'stages': self.stages,
+            'objects': self.objects,
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    # One line for the operator's report.
+    def summary(self):
+        text = 'Export took {:.2f}s, peak memory {:.1f} MB'.format(self.seconds, self.peakBytes / (1024.0 * 1024.0))
+        if(len(self.stages) != 0):
+            slowest = max(self.stages, key=lambda s: s['seconds'])
+            text += ', slowest stage {} ({:.2f}s)'.format(slowest['name'], slowest['seconds'])
+        if(len(self.objects) != 0):
+            slowest = max(self.objects, key=lambda o: o['seconds'])
+            text += ', slowest {} {} ({:.2f}s)'.format(slowest['kind'], slowest['name'], slowest['seconds'])
+        return text
+
+class StageTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.resetPeak()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        self.profiler.stages.append({'name': self.name, 'seconds': seconds, 'peakBytes': self.profiler.peakMemory()})
+        return False
+
+class ItemRecord:
+    def __init__(self, profiler, kind, name):
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+        self.counts = {}
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        self.profiler.objects.append({'kind': self.kind, 'name': self.name, 'seconds': seconds, 'counts': self.counts})
+        return False
+
+# Stands in for ExportProfiler when profiling is off; every call returns a
+# shared object that does nothing.
+class NullProfiler:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stage(self, name):
+        return nullRecord
+
+    def item(self, kind, name):
+        return nullRecord
+
+class NullRecord:
+    def count(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+nullRecord = NullRecord()
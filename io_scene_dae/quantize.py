@@ -0,0 +1,113 @@
+import numpy
+
+# Quantized attributes and their reference decoder. A quantized source is an
+# int_array with a technique of this profile describing how to get the
+# floats back:
+#
+#   <decode encoding="RANGE" offset="..." scale="..."/>
+#       value = offset + q * scale, offset and scale per component
+#   <decode encoding="OCTAHEDRAL" scale="..."/>
+#       (q * scale) is an octahedral unit vector (u, v), see octDecode
+profile = 'QUANTIZED'
+
+# 16 bit quantization over the range of every column of values (N x C):
+# unsigned q spans 0..65535 from the smallest to the largest value, signed
+# q spans -32767..32767. The error of any value is at most half a step,
+# (largest - smallest) / 131070. Returns q, offset and scale (float32, per
+# column).
+def quantizeRange(values, signed=False):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    # the column count comes from the shape, which empty arrays keep too
+    if(values.ndim == 1):
+        values = values.reshape(-1, 1)
+    if(len(values) == 0):
+        columns = values.shape[1]
+        return numpy.zeros(values.shape, dtype=numpy.int16 if signed else numpy.uint16), numpy.zeros(columns, dtype=numpy.float32), numpy.ones(columns, dtype=numpy.float32)
+    lo = values.min(axis=0)
+    hi = values.max(axis=0)
+    if(signed):
+        offset = ((lo + hi) * 0.5).astype(numpy.float32)
+        scale = ((hi - lo) / 65534.0).astype(numpy.float32)
+    else:
+        offset = lo.astype(numpy.float32)
+        scale = ((hi - lo) / 65535.0).astype(numpy.float32)
+    scale[scale == 0.0] = 1.0
+    q = numpy.rint((values - offset) / scale)
+    if(signed):
+        return numpy.clip(q, -32767, 32767).astype(numpy.int16), offset, scale
+    return numpy.clip(q, 0, 65535).astype(numpy.uint16), offset, scale
+
+def dequantizeRange(q, offset, scale):
+    return offset + q.astype(numpy.float32) * scale
+
+# Octahedral encoding of unit vectors (N x 3) as 16 bit (u, v) pairs: the
+# vector is projected onto the octahedron |x| + |y| + |z| = 1 and the lower
+# half folded over the upper one. Decoded normals are within a few hundredths
+# of a degree of the originals.
+octScale = 1.0 / 32767.0
+
+def octEncode(normals):
+    n = numpy.asarray(normals, dtype=numpy.float64)
+    length = numpy.abs(n).sum(axis=1)
+    length[length == 0.0] = 1.0
+    n = n / length[:, None]
+    u = n[:, 0].copy()
+    v = n[:, 1].copy()
+    lower = n[:, 2] < 0.0
+    signU = numpy.where(u >= 0.0, 1.0, -1.0)
+    signV = numpy.where(v >= 0.0, 1.0, -1.0)
+    u[lower] = ((1.0 - numpy.abs(n[:, 1])) * signU)[lower]
+    v[lower] = ((1.0 - numpy.abs(n[:, 0])) * signV)[lower]
+    return numpy.rint(numpy.column_stack((u, v)) * 32767.0).astype(numpy.int16)
+
+def octDecode(uv):
+    uv = numpy.asarray(uv, dtype=numpy.float64)
+    n = numpy.empty((len(uv), 3), dtype=numpy.float64)
+    n[:, 0] = uv[:, 0]
+    n[:, 1] = uv[:, 1]
+    n[:, 2] = 1.0 - numpy.abs(uv[:, 0]) - numpy.abs(uv[:, 1])
+    t = numpy.maximum(-n[:, 2], 0.0)
+    n[:, 0] -= numpy.where(n[:, 0] >= 0.0, t, -t)
+    n[:, 1] -= numpy.where(n[:, 1] >= 0.0, t, -t)
+    n /= numpy.linalg.norm(n, axis=1)[:, None]
+    return n.astype(numpy.float32)
+
+# 8 bit normalized weights, q / 255. Every weight is rounded down, then the
+# influences with the largest remainders of each vertex (owners gives the
+# vertex of every weight) are rounded up until the vertex's quantized
+# weights add up to its rounded sum, so normalized weights stay normalized.
+weightScale = 1.0 / 255.0
+
+def quantizeWeights(weights, owners, vertexCount):
+    scaled = numpy.clip(numpy.asarray(weights, dtype=numpy.float64), 0.0, 1.0) * 255.0
+    q = numpy.floor(scaled)
+    target = numpy.rint(numpy.bincount(owners, scaled, minlength=vertexCount))
+    deficit = target - numpy.bincount(owners, q, minlength=vertexCount)
+    order = numpy.lexsort((q - scaled, owners))
+    sortedOwners = owners[order]
+    rank = numpy.arange(len(order)) - numpy.searchsorted(sortedOwners, sortedOwners, side='left')
+    q[order[rank < deficit[sortedOwners]]] += 1.0
+    return numpy.clip(q, 0, 255).astype(numpy.uint8)
+
+def floatsText(values):
+    return ' '.join( '{:.9g}'.format(v) for v in numpy.asarray(values, dtype=numpy.float32).ravel().tolist() )
+
+# The (profile, tag, attrib) technique of a quantized source, for
+# buildSource.
+def decodeTechnique(encoding, offset=None, scale=None):
+    attrib = [('encoding', encoding)]
+    if(offset is not None):
+        attrib.append(('offset', floatsText(offset)))
+    if(scale is not None):
+        attrib.append(('scale', floatsText(scale)))
+    return (profile, 'decode', attrib)
+
+# Reference decoder: the floats of a quantized source, N x stride, from its
+# integers and the attributes of its decode element.
+def decodeAttribute(values, stride, decode):
+    values = numpy.asarray(values, dtype=numpy.float64).reshape(-1, stride)
+    scale = numpy.array(decode['scale'].split(), dtype=numpy.float64)
+    if(decode.get('encoding', 'RANGE') == 'OCTAHEDRAL'):
+        return octDecode(values * scale)
+    offset = numpy.array(decode.get('offset', '0').split(), dtype=numpy.float64)
+    return (offset + values * scale).astype(numpy.float32)
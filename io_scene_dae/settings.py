@@ -0,0 +1,66 @@
+# Everything the exporter can be configured with. The operator fills one in
+# from its properties; export() falls back to the defaults.
+class ExportSettings:
+    def __init__(self):
+        self.indent = '\t'
+        # decimal digits written for positions, normals, matrices and weights
+        self.precision = 4
+        self.uvPrecision = 4
+        # '1.5000' -> '1.5', '2.0000' -> '2'
+        self.trimZeros = True
+        # reorder triangles for the post-transform vertex cache (tipsify)
+        # and vertices into first use order
+        self.optimizeVertexCache = False
+        self.vertexCacheSize = 16
+        # write meshes with identical contents once and instance that geometry
+        self.instanceGeometry = True
+        # triangle ratios of the reduced detail geometries written next to
+        # every mesh, e.g. (0.5, 0.25); empty writes none
+        self.lodRatios = ()
+        # 'SPLIT': per loop normals (smooth shading, auto smooth and custom
+        # normals), 'FLAT': polygon normals. Vertices are welded on position,
+        # normal and uvs, so FLAT gives every corner of a face its own vertex
+        # (and its own copy of the skin influences), which makes smooth
+        # meshes about three times the size
+        self.normals = 'SPLIT'
+        # skin: influences per vertex (0 keeps all), weights below minWeight
+        # are dropped, normalizeWeights rescales the kept ones to sum to one
+        self.maxInfluences = 0
+        self.minWeight = 0.0
+        self.normalizeWeights = False
+        # drop animation keys that linear interpolation of their neighbours
+        # reproduces within these errors (scene units, degrees, scale factor)
+        self.reduceKeys = False
+        self.keyPositionError = 0.001
+        self.keyRotationError = 0.1
+        self.keyScaleError = 0.001
+        # vertex animation (mesh and shape key actions): vertices moving less
+        # than this along every axis are left out, quantizeVertexDeltas
+        # writes the deltas as 16 bit integers over the clip's range
+        self.vertexDeltaThreshold = 0.0001
+        self.quantizeVertexDeltas = False
+        # write positions and uvs as 16 bit integers over their bounding box,
+        # normals octahedral and skin weights as 8 bit integers, each source
+        # with the parameters to decode it (see quantize.py)
+        self.quantizeAttributes = False
+        # write arrays of at least binaryThreshold values to a little-endian
+        # .bin file next to the .dae instead of inlining them as text
+        self.binarySidecar = False
+        self.binaryThreshold = 256
+        # directory of the incremental export cache, None turns it off
+        self.cacheDirectory = None
+        self.cacheSize = 512 * 1024 * 1024
+        # processes geometries and controllers are written on, 1 is serial
+        self.workers = 1
+        # time every stage and object and write <name>.profile.json;
+        # profileMemory traces allocations for per stage peaks, which slows
+        # the export down several times (see profiler.py)
+        self.profile = False
+        self.profileMemory = False
+
+    # Settings that change the written text; part of every cache key.
+    def outputKey(self):
+        return tuple( (k, v) for k, v in sorted(vars(self).items()) if k not in runtimeOnly )
+
+# Settings that only change how the export runs, not what it writes.
+runtimeOnly = ('cacheDirectory', 'cacheSize', 'workers', 'profile', 'profileMemory')
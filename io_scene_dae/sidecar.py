@@ -0,0 +1,73 @@
+import mmap
+import os
+import numpy
+
+# Written into the <technique profile> / <extra> blocks that point at the
+# sidecar, and read back by SidecarReader users.
+profile = 'BINARY_SIDECAR'
+
+types = {
+    'float32': numpy.dtype('<f4'),
+    'int32': numpy.dtype('<i4'),
+    'int16': numpy.dtype('<i2'),
+    'uint16': numpy.dtype('<u2'),
+    'uint8': numpy.dtype('u1'),
+}
+
+class BinaryRef:
+    def __init__(self, url, offset, count, type):
+        self.url = url
+        self.offset = offset
+        self.count = count
+        self.type = type
+
+    def attrib(self):
+        return [('url', self.url), ('offset', str(self.offset)), ('count', str(self.count)), ('type', self.type)]
+
+# Appends arrays to a little-endian binary file next to the .dae. Every
+# array starts at a multiple of alignment so readers can map it in place.
+# Arrays with fewer than threshold values stay inline as text.
+class SidecarWriter:
+    def __init__(self, path, threshold=256, alignment=16):
+        self.path = path
+        self.url = os.path.basename(path)
+        self.threshold = threshold
+        self.alignment = alignment
+        self.offset = 0
+        self.file = open(path, 'wb')
+
+    def wants(self, values):
+        return numpy.size(values) >= self.threshold
+
+    def append(self, values, type):
+        data = numpy.ascontiguousarray(values, dtype=types[type]).ravel()
+        padding = (-self.offset) % self.alignment
+        if(padding != 0):
+            self.file.write(b'\0' * padding)
+            self.offset += padding
+        ref = BinaryRef(self.url, self.offset, len(data), type)
+        self.file.write(data.tobytes())
+        self.offset += data.nbytes
+        return ref
+
+    def close(self):
+        self.file.close()
+
+# Memory-maps a sidecar file; view() returns NumPy arrays that point straight
+# into the mapping, without copying.
+class SidecarReader:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = None
+        if(os.fstat(self.file.fileno()).st_size != 0):
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def view(self, offset, count, type):
+        if(count == 0):
+            return numpy.empty(0, dtype=types[type])
+        return numpy.frombuffer(self.map, dtype=types[type], count=count, offset=offset)
+
+    def close(self):
+        if(self.map != None):
+            self.map.close()
+        self.file.close()
@@ -0,0 +1,189 @@
+import heapq
+import numpy
+
+from .mesh_arrays import VertexBuffers, attributeRows
+
+# Quadric error simplification (Garland and Heckbert, "Surface
+# Simplification Using Quadric Error Metrics", 1997) by half edge
+# collapses: a vertex is always merged into one of its neighbours and never
+# moved, so every vertex of a simplified mesh is a vertex of the original,
+# with its normal, uvs and skin weights unchanged.
+
+# Plane quadric of every triangle, area weighted, as the 10 coefficients
+# aa ab ac ad bb bc bd cc cd dd, summed per vertex.
+def vertexQuadrics(positions, triangles):
+    p = positions.astype(numpy.float64)
+    a = p[triangles[:, 0]]
+    cross = numpy.cross(p[triangles[:, 1]] - a, p[triangles[:, 2]] - a)
+    area = numpy.linalg.norm(cross, axis=1)
+    normals = cross / numpy.where(area == 0.0, 1.0, area)[:, None]
+    d = -(normals * a).sum(axis=1)
+    planes = numpy.column_stack((normals, d))
+    pairs = [ (0, 0), (0, 1), (0, 2), (0, 3), (1, 1), (1, 2), (1, 3), (2, 2), (2, 3), (3, 3) ]
+    terms = numpy.column_stack([ planes[:, i] * planes[:, j] for i, j in pairs ]) * (area * 0.5)[:, None]
+    quadrics = numpy.zeros((len(positions), 10), dtype=numpy.float64)
+    for corner in range(3):
+        numpy.add.at(quadrics, triangles[:, corner], terms)
+    return quadrics
+
+# Error of the point (x, y, z) under quadric q; works on plain floats and on
+# arrays alike.
+def quadricError(q, x, y, z):
+    return (q[0] * x * x + 2.0 * q[1] * x * y + 2.0 * q[2] * x * z + 2.0 * q[3] * x
+        + q[4] * y * y + 2.0 * q[5] * y * z + 2.0 * q[6] * y
+        + q[7] * z * z + 2.0 * q[8] * z + q[9])
+
+# Undirected edges of every triangle as one int64 key each, smaller vertex
+# first.
+def edgeKeys(triangles, vertexCount):
+    edges = numpy.concatenate((triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]])).astype(numpy.int64)
+    edges.sort(axis=1)
+    return edges[:, 0] * vertexCount + edges[:, 1]
+
+# Vertices at the end of an edge only one triangle uses.
+def borderVertices(triangles, vertexCount):
+    keys, counts = numpy.unique(edgeKeys(triangles, vertexCount), return_counts=True)
+    keys = keys[counts == 1]
+    border = numpy.zeros(vertexCount, dtype=bool)
+    border[keys // vertexCount] = True
+    border[keys % vertexCount] = True
+    return border
+
+def faceNormal(p, a, b, c):
+    ux = p[b][0] - p[a][0]
+    uy = p[b][1] - p[a][1]
+    uz = p[b][2] - p[a][2]
+    vx = p[c][0] - p[a][0]
+    vy = p[c][1] - p[a][1]
+    vz = p[c][2] - p[a][2]
+    return (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+
+# Collapses edges, cheapest first, until at most targetCount triangles are
+# left or no allowed collapse remains. Locked vertices are never removed.
+# A collapse that would flip a triangle is skipped. Returns the remaining
+# triangles, T x 3 indices into positions.
+def simplify(positions, indices, locked, targetCount):
+    triangles = indices.reshape(-1, 3)
+    vertexCount = len(positions)
+    quadrics = vertexQuadrics(positions, triangles)
+    p = positions.astype(numpy.float64)
+
+    # Collapses u -> v in both directions of every edge, costed in one go;
+    # the heap entries carry the versions of u and v they were costed at.
+    keys = numpy.unique(edgeKeys(triangles, vertexCount))
+    u = keys // vertexCount
+    v = keys % vertexCount
+    u, v = numpy.concatenate((u, v)), numpy.concatenate((v, u))
+    keep = (u != v) & ~locked[u]
+    u = u[keep]
+    v = v[keep]
+    costs = quadricError((quadrics[u] + quadrics[v]).T, p[v, 0], p[v, 1], p[v, 2])
+    zeros = [0] * len(u)
+    heap = list(zip(costs.tolist(), u.tolist(), v.tolist(), zeros, zeros))
+    heapq.heapify(heap)
+
+    quadrics = quadrics.tolist()
+    p = p.tolist()
+    tris = triangles.tolist()
+    alive = [True] * len(tris)
+    aliveCount = len(tris)
+    vertexTris = [ set() for v in range(vertexCount) ]
+    for t, tri in enumerate(tris):
+        for w in tri:
+            vertexTris[w].add(t)
+    locked = locked.tolist()
+    removed = [False] * vertexCount
+    version = [0] * vertexCount
+
+    while aliveCount > targetCount and len(heap) != 0:
+        cost, u, v, versionU, versionV = heapq.heappop(heap)
+        if(removed[u] or removed[v] or versionU != version[u] or versionV != version[v]):
+            continue
+
+        flips = False
+        for t in vertexTris[u]:
+            tri = tris[t]
+            if(v in tri):
+                continue
+            before = faceNormal(p, tri[0], tri[1], tri[2])
+            after = [ v if w == u else w for w in tri ]
+            after = faceNormal(p, after[0], after[1], after[2])
+            if(before[0] * after[0] + before[1] * after[1] + before[2] * after[2] <= 0.0):
+                flips = True
+                break
+        if(flips):
+            continue
+
+        for t in list(vertexTris[u]):
+            tri = tris[t]
+            if(v in tri):
+                alive[t] = False
+                aliveCount -= 1
+                for w in tri:
+                    vertexTris[w].discard(t)
+            else:
+                tri[tri.index(u)] = v
+                vertexTris[v].add(t)
+        vertexTris[u] = set()
+        removed[u] = True
+        qu = quadrics[u]
+        qv = quadrics[v]
+        quadrics[v] = [ qu[i] + qv[i] for i in range(10) ]
+        version[v] += 1
+
+        neighbours = set()
+        for t in vertexTris[v]:
+            neighbours.update(tris[t])
+        neighbours.discard(v)
+        qv = quadrics[v]
+        pv = p[v]
+        errorV = quadricError(qv, pv[0], pv[1], pv[2])
+        for w in neighbours:
+            qw = quadrics[w]
+            pw = p[w]
+            if(not locked[w]):
+                heapq.heappush(heap, (quadricError(qw, pv[0], pv[1], pv[2]) + errorV, w, v, version[w], version[v]))
+            if(not locked[v]):
+                heapq.heappush(heap, (quadricError(qv, pw[0], pw[1], pw[2]) + quadricError(qw, pw[0], pw[1], pw[2]), v, w, version[v], version[w]))
+    return numpy.array([ tris[t] for t in range(len(tris)) if alive[t] ], dtype=numpy.int64).reshape(-1, 3)
+
+# A simplified copy of buffers keeping about ratio of its triangles.
+# Vertices on uv (and, with split normals, normal) seams and on open
+# borders stay, so the simplified mesh keeps its outline and uv islands.
+# With flat normals the base is welded on uvs alone and every simplified
+# triangle gets its own face normal back.
+def simplifyBuffers(base, ratio, flatNormals):
+    triangleCount = len(base.indices) // 3
+    groupSizes = numpy.bincount(base.sourceVertices)
+    locked = groupSizes[base.sourceVertices] > 1
+    locked |= borderVertices(base.indices.reshape(-1, 3), len(base.positions))
+    triangles = simplify(base.positions, base.indices, locked, int(triangleCount * ratio))
+
+    corners = triangles.ravel()
+    if(flatNormals):
+        p = base.positions.astype(numpy.float64)
+        cross = numpy.cross(p[triangles[:, 1]] - p[triangles[:, 0]], p[triangles[:, 2]] - p[triangles[:, 0]])
+        length = numpy.linalg.norm(cross, axis=1)
+        normals = (cross / numpy.where(length == 0.0, 1.0, length)[:, None]).astype(numpy.float32)
+        rows = attributeRows(corners, [numpy.repeat(normals, 3, axis=0)])
+        normals = numpy.repeat(normals, 3, axis=0)
+    else:
+        rows = corners
+        normals = base.normals[corners]
+
+    uniqueRows, keys = numpy.unique(rows, return_inverse=True)
+    keys = keys.ravel()
+    usedKeys, firstUse = numpy.unique(keys, return_index=True)
+    byFirstUse = numpy.argsort(firstUse, kind='mergesort')
+    remap = numpy.empty(len(uniqueRows), dtype=numpy.int64)
+    remap[usedKeys[byFirstUse]] = numpy.arange(len(usedKeys))
+    firstCorners = firstUse[byFirstUse]
+    vertices = corners[firstCorners]
+
+    lod = VertexBuffers()
+    lod.positions = base.positions[vertices]
+    lod.normals = normals[firstCorners]
+    lod.uvLayers = [ uvs[vertices] for uvs in base.uvLayers ]
+    lod.sourceVertices = base.sourceVertices[vertices]
+    lod.indices = remap[keys]
+    return lod
@@ -0,0 +1,108 @@
+import numpy
+
+# Average cache miss ratio, misses per triangle, of a FIFO post-transform
+# cache of cacheSize vertices. A vertex is cached while fewer than
+# cacheSize misses happened since it was loaded.
+def acmr(indices, cacheSize=16):
+    triangleCount = len(indices) // 3
+    if(triangleCount == 0):
+        return 0.0
+    loaded = {}
+    misses = 0
+    for v in indices.tolist():
+        t = loaded.get(v)
+        if(t == None or misses - t >= cacheSize):
+            loaded[v] = misses
+            misses += 1
+    return misses / float(triangleCount)
+
+# Triangles around every vertex, as CSR offsets into a triangle list.
+def vertexTriangles(indices, vertexCount):
+    order = numpy.argsort(indices, kind='mergesort')
+    counts = numpy.bincount(indices, minlength=vertexCount)
+    offsets = numpy.zeros(vertexCount + 1, dtype=numpy.int64)
+    numpy.cumsum(counts, out=offsets[1:])
+    return offsets, order // 3, counts
+
+# Tipsify (Sander, Nehab and Barczak, "Fast Triangle Reordering for Vertex
+# Locality and Reduced Overdraw", 2007). Fans out from one vertex at a time
+# and picks the next fanning vertex among the ones just emitted, preferring
+# those that will still be in the cache once their remaining triangles are
+# emitted. Runs in time linear in the triangle count.
+#
+# Returns the new order of the triangles.
+def tipsify(indices, vertexCount, cacheSize=16):
+    triangleCount = len(indices) // 3
+    offsets, adjacency, counts = vertexTriangles(indices, vertexCount)
+    offsets = offsets.tolist()
+    adjacency = adjacency.tolist()
+    live = counts.tolist()
+    corners = indices.tolist()
+    cacheTime = [0] * vertexCount
+    emitted = [False] * triangleCount
+    deadEnd = []
+    order = []
+    stamp = cacheSize + 1
+    cursor = 0
+
+    fanning = 0 if vertexCount != 0 else -1
+    while fanning >= 0:
+        candidates = []
+        for t in adjacency[offsets[fanning]:offsets[fanning + 1]]:
+            if(emitted[t]):
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in corners[3 * t:3 * t + 3]:
+                deadEnd.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if(stamp - cacheTime[v] > cacheSize):
+                    cacheTime[v] = stamp
+                    stamp += 1
+
+        # Next fanning vertex: the candidate with triangles left that was
+        # cached longest ago but would stay in the cache through its fan.
+        fanning = -1
+        best = -1
+        for v in candidates:
+            if(live[v] > 0):
+                priority = 0
+                if(stamp - cacheTime[v] + 2 * live[v] <= cacheSize):
+                    priority = stamp - cacheTime[v]
+                if(priority > best):
+                    best = priority
+                    fanning = v
+        if(fanning == -1):
+            while len(deadEnd) != 0:
+                v = deadEnd.pop()
+                if(live[v] > 0):
+                    fanning = v
+                    break
+        if(fanning == -1):
+            while cursor < vertexCount:
+                if(live[cursor] > 0):
+                    fanning = cursor
+                    break
+                cursor += 1
+    return numpy.array(order, dtype=numpy.int64)
+
+# Reorders the triangles of buffers with tipsify, then renumbers the
+# vertices in the order the new triangle list first uses them. Returns the
+# ACMR before and after.
+def optimizeVertexCache(buffers, cacheSize=16):
+    vertexCount = len(buffers.positions)
+    before = acmr(buffers.indices, cacheSize)
+    triangles = buffers.indices.reshape(-1, 3)
+    triangles = triangles[tipsify(buffers.indices, vertexCount, cacheSize)].ravel()
+
+    used, firstUse = numpy.unique(triangles, return_index=True)
+    byFirstUse = used[numpy.argsort(firstUse, kind='mergesort')]
+    remap = numpy.empty(vertexCount, dtype=numpy.int64)
+    remap[byFirstUse] = numpy.arange(len(byFirstUse))
+    buffers.indices = remap[triangles]
+    buffers.positions = buffers.positions[byFirstUse]
+    buffers.normals = buffers.normals[byFirstUse]
+    buffers.uvLayers = [ uvs[byFirstUse] for uvs in buffers.uvLayers ]
+    buffers.sourceVertices = buffers.sourceVertices[byFirstUse]
+    return before, acmr(buffers.indices, cacheSize)